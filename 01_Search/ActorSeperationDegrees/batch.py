@@ -0,0 +1,174 @@
+import argparse
+import json
+import multiprocessing
+import socketserver
+import sys
+
+import degrees
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answer many degrees of separation queries."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--input", default="-",
+                        help="JSONL file with queries (default: stdin)")
+    parser.add_argument("--serve", metavar="ADDRESS",
+                        help="listen on HOST:PORT or a Unix socket path")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes answering queries")
+    parser.add_argument("--compact", action="store_true",
+                        help="keep the data in a compact integer graph")
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="do not read or write the compact graph snapshot")
+    args = parser.parse_args()
+
+    print("Loading data...", file=sys.stderr)
+    degrees.load_data(args.directory, compact=args.compact, cache=args.cache)
+    print("Data loaded.", file=sys.stderr)
+
+    pool = start_pool(args.workers, args.directory, args.compact, args.cache)
+    try:
+        if args.serve:
+            serve(args.serve, pool)
+        elif args.input == "-":
+            answer_stream(sys.stdin, sys.stdout, pool)
+        else:
+            with open(args.input, encoding="utf-8") as f:
+                answer_stream(f, sys.stdout, pool)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def start_pool(workers, directory, compact, cache):
+    """
+    Starts `workers` processes for answering queries, or returns None if a
+    single worker was asked for. Forked workers share the data loaded in
+    this process read-only; elsewhere every worker loads the data itself.
+    """
+    if workers <= 1:
+        return None
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork").Pool(workers)
+    return multiprocessing.Pool(workers, initializer=degrees.load_data,
+                                initargs=(directory, compact, cache))
+
+
+def answer_stream(lines, out, pool):
+    """
+    Answers every JSONL query in `lines`, writing one JSON result line to
+    `out` as soon as each query finishes. With a pool, results are written
+    in completion order; the query's "id" is echoed to match them up.
+    """
+    queries = (line for line in lines if line.strip())
+    if pool is None:
+        results = map(answer, queries)
+    else:
+        results = pool.imap_unordered(answer, queries)
+    for result in results:
+        out.write(result + "\n")
+        out.flush()
+
+
+def answer(line):
+    """
+    Answers a single query line such as
+    {"id": 1, "source": "Kevin Bacon", "target": "Tom Hanks"}.
+    `source` and `target` may be person ids or unambiguous names.
+    Returns the result as a JSON string.
+    """
+    # Holds the query's "id" once it is parsed, so errors echo it too
+    result = {}
+    try:
+        query = json.loads(line)
+        result["id"] = query.get("id")
+        source = resolve(query["source"])
+        target = resolve(query["target"])
+        engine = query.get("engine", "bidirectional")
+        if engine not in degrees.ENGINES:
+            raise ValueError(f"unknown engine {engine!r}")
+    except (ValueError, AttributeError, TypeError) as e:
+        result["error"] = f"invalid query: {e}"
+        return json.dumps(result)
+    except KeyError as e:
+        result["error"] = f"missing {e}"
+        return json.dumps(result)
+    except LookupError as e:
+        result["error"] = str(e)
+        return json.dumps(result)
+
+    result["source"] = source
+    result["target"] = target
+    path = degrees.shortest_path(source, target, engine=engine)
+    if path is None:
+        result["degrees"] = None
+        result["path"] = None
+    else:
+        result["degrees"] = len(path)
+        result["path"] = [{"movie": movie, "person": person}
+                          for movie, person in path]
+    return json.dumps(result)
+
+
+def resolve(person):
+    """
+    Returns the person_id for a person id or an unambiguous name.
+    Raises LookupError if there is no such person or the name is ambiguous.
+    """
+    if person in degrees.people:
+        return person
+    person_ids = degrees.names.get(str(person).lower(), set())
+    if len(person_ids) == 1:
+        return next(iter(person_ids))
+    elif len(person_ids) == 0:
+        raise LookupError(f"person not found: {person}")
+    raise LookupError(f"ambiguous name {person!r}, "
+                      f"use one of the ids {sorted(person_ids)}")
+
+
+def serve(address, pool):
+    """
+    Answers queries sent over a local socket, one JSONL query per line.
+    `address` is HOST:PORT for TCP, otherwise a Unix socket path.
+    """
+
+    class QueryHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            lines = (line.decode("utf-8") for line in self.rfile)
+            answer_stream(lines, SocketWriter(self.wfile), pool)
+
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        server = socketserver.ThreadingTCPServer(
+            (host or "127.0.0.1", int(port)), QueryHandler)
+    else:
+        server = socketserver.ThreadingUnixStreamServer(address, QueryHandler)
+    server.daemon_threads = True
+
+    print(f"Serving queries on {address}", file=sys.stderr)
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+class SocketWriter():
+    """
+    Text writer over a socket file, as expected by answer_stream.
+    """
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        self.wfile.write(text.encode("utf-8"))
+
+    def flush(self):
+        self.wfile.flush()
+
+
+if __name__ == "__main__":
+    main()
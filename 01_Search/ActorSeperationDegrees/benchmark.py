@@ -0,0 +1,250 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Ways of loading the data that are measured
+MODES = ("dict", "compact", "snapshot")
+
+CSV_FILES = ("people.csv", "movies.csv", "stars.csv")
+
+# Parameters of the generated data, written next to the CSV files
+MANIFEST_FILE = "generation.json"
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "son", "vi", "der", "an", "bel",
+             "cor", "da", "el", "fin", "gar", "ho", "is", "jo", "mar", "no"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark loading and searching the degrees data."
+    )
+    parser.add_argument("directory",
+                        help="directory for the synthetic CSV files")
+    parser.add_argument("--people", type=int, default=100000)
+    parser.add_argument("--movies", type=int, default=30000)
+    parser.add_argument("--alpha", type=float, default=1.6,
+                        help="power-law exponent of the cast sizes")
+    parser.add_argument("--max-cast", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=50)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--engines", nargs="+", default=["bidirectional"])
+    parser.add_argument("--output", help="write the results to this file")
+    args = parser.parse_args()
+
+    generation = {
+        "people": args.people,
+        "movies": args.movies,
+        "alpha": args.alpha,
+        "max_cast": args.max_cast,
+        "seed": args.seed
+    }
+    # Data generated with other parameters is generated again, but CSV
+    # files this script did not write are never overwritten
+    manifest = read_manifest(args.directory)
+    if (not os.path.exists(os.path.join(args.directory, "stars.csv"))
+            or manifest is not None and manifest != generation):
+        print(f"Generating data in {args.directory}...", file=sys.stderr)
+        generate(args.directory, args.people, args.movies,
+                 args.alpha, args.max_cast, args.seed)
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "data": {
+            "directory": args.directory,
+            # None for CSV files that were not generated by this script
+            "generated": read_manifest(args.directory),
+            "rows": {filename: count_rows(args.directory, filename)
+                     for filename in CSV_FILES}
+        },
+        "modes": {}
+    }
+    for mode in args.modes:
+        print(f"Measuring {mode}...", file=sys.stderr)
+        results["modes"][mode] = {
+            "memory": isolated(measure_memory, args.directory, mode),
+            **isolated(measure_speed, args.directory, mode,
+                       args.engines, args.queries, args.seed)
+        }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def generate(directory, peopleCount, movieCount, alpha, maxCast, seed):
+    """
+    Writes synthetic people.csv, movies.csv and stars.csv files. Cast sizes
+    follow a power law, and a few prolific people star in many movies.
+    The parameters are recorded in MANIFEST_FILE next to them.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    manifestPath = os.path.join(directory, MANIFEST_FILE)
+    if os.path.exists(manifestPath):
+        os.remove(manifestPath)
+
+    with open(os.path.join(directory, "people.csv"), "w", newline="",
+              encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "birth"])
+        for i in range(peopleCount):
+            writer.writerow([i + 1, f"{fake_name(rng)} {fake_name(rng)}",
+                             rng.randint(1920, 2005)])
+
+    with open(os.path.join(directory, "movies.csv"), "w", newline="",
+              encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "year"])
+        for i in range(movieCount):
+            writer.writerow([i + 1, f"The {fake_name(rng)}",
+                             rng.randint(1930, 2020)])
+
+    with open(os.path.join(directory, "stars.csv"), "w", newline="",
+              encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["person_id", "movie_id"])
+        for movie in range(movieCount):
+            castSize = min(maxCast, int(rng.paretovariate(alpha)) + 1)
+            cast = {int(peopleCount * rng.random() ** 2)
+                    for _ in range(castSize)}
+            for person in sorted(cast):
+                writer.writerow([person + 1, movie + 1])
+
+    with open(manifestPath, "w") as f:
+        json.dump({"people": peopleCount, "movies": movieCount,
+                   "alpha": alpha, "max_cast": maxCast, "seed": seed}, f)
+
+
+def read_manifest(directory):
+    """
+    Returns the parameters the data in `directory` was generated with, or
+    None if it was not generated by this script.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def count_rows(directory, filename):
+    with open(os.path.join(directory, filename), "rb") as f:
+        return sum(1 for _ in f) - 1
+
+
+def fake_name(rng):
+    name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+    return name.capitalize()
+
+
+def isolated(function, *args):
+    """
+    Runs `function(*args)` in a fresh process, so every measurement starts
+    from an empty interpreter, and returns its result.
+    """
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def load(directory, mode):
+    import degrees
+
+    if mode == "dict":
+        degrees.load_data(directory)
+    elif mode == "compact":
+        degrees.load_data(directory, compact=True, cache=False)
+    else:
+        degrees.load_data(directory, compact=True, cache=True)
+    return degrees
+
+
+def measure_memory(directory, mode):
+    """
+    Returns the peak of memory allocated by Python while loading the data.
+    """
+    if mode == "snapshot":
+        # Make sure the snapshot exists, so the measured load maps it
+        load(directory, mode)
+    tracemalloc.start()
+    load(directory, mode)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"peak_bytes": peak}
+
+
+def measure_speed(directory, mode, engines, queryCount, seed):
+    """
+    Times loading the data and a fixed random set of queries per engine.
+    """
+    if mode == "snapshot":
+        load(directory, mode)
+    start = time.perf_counter()
+    degrees = load(directory, mode)
+    loadSeconds = time.perf_counter() - start
+
+    # Query people who starred in something, so most queries need a search
+    rng = random.Random(seed)
+    person_ids = sorted(person_id for person_id in degrees.people
+                        if degrees.people[person_id]["movies"])
+    queries = [(rng.choice(person_ids), rng.choice(person_ids))
+               for _ in range(queryCount)]
+
+    results = {"load_seconds": round(loadSeconds, 4), "engines": {}}
+    for engine in engines:
+        latencies = []
+        connected = 0
+        for source, target in queries:
+            start = time.perf_counter()
+            path = degrees.shortest_path(source, target, engine=engine)
+            latencies.append(time.perf_counter() - start)
+            connected += path is not None
+        results["engines"][engine] = latency_summary(latencies, connected)
+    return results
+
+
+def latency_summary(latencies, connected):
+    latencies = sorted(latencies)
+    return {
+        "queries": len(latencies),
+        "connected": connected,
+        "mean_ms": round(1000 * statistics.fmean(latencies), 3),
+        "p50_ms": round(1000 * percentile(latencies, 50), 3),
+        "p99_ms": round(1000 * percentile(latencies, 99), 3)
+    }
+
+
+def percentile(values, percent):
+    """
+    Returns the nearest-rank percentile of sorted `values`.
+    """
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
+import argparse
 import csv
+import heapq
+import itertools
+import os
 import sys
 
+from graph import CompactGraph, MoviesView, NamesView, PeopleView, snapshot_key
+from hubs import HubTables
+from nameindex import NameIndex
 from util import Node, StackFrontier, QueueFrontier
 
 # Maps names to a set of corresponding person_ids
@@ -12,11 +19,39 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# File next to the CSVs that caches the compact graph between runs
+SNAPSHOT_FILE = "degrees.snapshot"
 
-def load_data(directory):
+# CompactGraph holding the data when loaded with compact=True, else None
+graph = None
+
+# Precomputed HubTables of the compact graph, see hubs.py
+hubTables = None
+
+# NameIndex over `names` for fuzzy lookups, built on first use
+nameIndex = None
+
+# Search engines accepted by shortest_path
+ENGINES = ("bfs", "bidirectional")
+
+
+def load_data(directory, compact=False, cache=True):
     """
     Load data from CSV files into memory.
+
+    With `compact`, the data is kept in an integer-indexed CompactGraph and
+    `names`, `people` and `movies` become read-only views of it. The graph
+    is then also cached in a binary snapshot next to the CSV files (unless
+    `cache` is False), which later runs memory-map instead of parsing the
+    CSV files again, as long as the files have not changed.
     """
+    global hubTables, nameIndex
+    nameIndex = None
+    if compact:
+        load_graph(load_compact_graph(directory, cache))
+        hubTables = HubTables(directory, graph, snapshot_key(directory))
+        return
+
     # Load people
     with open(f"{directory}/people.csv", encoding="utf-8") as f:
         reader = csv.DictReader(f)
@@ -52,14 +87,54 @@ def load_data(directory):
                 pass
 
 
+def load_compact_graph(directory, cache):
+    """
+    Returns the CompactGraph for `directory`, from its snapshot if that is
+    up to date, else built from the CSV files.
+    """
+    if not cache:
+        return CompactGraph.from_csv(directory)
+
+    path = os.path.join(directory, SNAPSHOT_FILE)
+    key = snapshot_key(directory)
+    compactGraph = CompactGraph.from_snapshot(path, key)
+    if compactGraph is None:
+        compactGraph = CompactGraph.from_csv(directory)
+        try:
+            compactGraph.save_snapshot(path, key)
+        except OSError:
+            # A read-only data directory just means no cache
+            pass
+    return compactGraph
+
+
+def load_graph(compactGraph):
+    """
+    Makes a CompactGraph the data source for all lookups and searches.
+    """
+    global graph, names, people, movies
+    graph = compactGraph
+    names = NamesView(graph)
+    people = PeopleView(graph)
+    movies = MoviesView(graph)
+
+
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(
+        description="Find the degrees of separation between two actors."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--engine", choices=ENGINES, default="bidirectional",
+                        help="search engine used to find the path")
+    parser.add_argument("--compact", action="store_true",
+                        help="keep the data in a compact integer graph")
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="do not read or write the compact graph snapshot")
+    args = parser.parse_args()
 
     # Load data from files into memory
     print("Loading data...")
-    load_data(directory)
+    load_data(args.directory, compact=args.compact, cache=args.cache)
     print("Data loaded.")
 
     source = person_id_for_name(input("Name: "))
@@ -69,7 +144,7 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    path = shortest_path(source, target, engine=args.engine)
 
     if path is None:
         print("Not connected.")
@@ -84,13 +159,50 @@ def main():
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
-def shortest_path(source, target):
+def shortest_path(source, target, engine="bidirectional", skip_movies=True):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
+    `engine` selects the search: "bfs" expands a single frontier from
+    the source, "bidirectional" grows frontiers from both ends and
+    stops when they meet. With `skip_movies`, the cast of each movie is
+    scanned at most once per search direction.
+
     If no possible path, returns None.
     """
+    if engine == "bfs":
+        search = breadth_first_search
+    elif engine == "bidirectional":
+        search = bidirectional_search
+    else:
+        raise ValueError(f"unknown engine {engine!r}")
+
+    if graph is None:
+        return search(source, target, iter_neighbors, skip_movies)
+
+    # Search on integer indices and translate the result back to ids
+    source = graph.person_index[source]
+    target = graph.person_index[target]
+    found, path = (hubTables.shortest_path(source, target)
+                   if hubTables is not None else (False, None))
+    if not found:
+        path = search(source, target, graph.neighbors, skip_movies)
+    return None if path is None else graph.path_ids(path)
+
+
+def breadth_first_search(source, target, neighbors, skipMovies=False):
+    """
+    Single-frontier breadth-first search from source to target.
+    `neighbors(person, visitedMovies)` yields the (movie, person) pairs to
+    expand, skipping and recording movies in `visitedMovies` unless that
+    is None. Skipping is safe because breadth-first order means a movie
+    seen again can only lead to people that are already reached.
+    """
+    if source == target:
+        return []
+
+    visitedMovies = set() if skipMovies else None
     alreadyExplored = set()
     frontier = QueueFrontier()
     frontier.add(Node(state=source, parent=None, action=None))
@@ -101,7 +213,7 @@ def shortest_path(source, target):
 
         node = frontier.remove()
        
-        for movie, actor in neighbors_for_person(node.state):
+        for movie, actor in neighbors(node.state, visitedMovies):
             if not actor in alreadyExplored and not frontier.contains_state(actor):
                 child = Node(state=actor, parent=node, action=movie)
 
@@ -110,6 +222,224 @@ def shortest_path(source, target):
                 frontier.add(child)
         alreadyExplored.add(node.state)
 
+
+def bidirectional_search(source, target, neighbors, skipMovies=False):
+    """
+    Breadth-first search that grows one frontier from the source and one
+    from the target, always expanding a whole layer of the smaller side.
+    The first person reached by both sides lies on a shortest path,
+    because every meeting found while expanding a single layer has the
+    same total length. `skipMovies` works as in breadth_first_search, with
+    one set of visited movies per direction.
+    """
+    if source == target:
+        return []
+
+    # Map each reached person to the (person, movie) they were reached from
+    forwardParents = {source: None}
+    backwardParents = {target: None}
+    forwardLayer = [source]
+    backwardLayer = [target]
+    forwardMovies = set() if skipMovies else None
+    backwardMovies = set() if skipMovies else None
+
+    while forwardLayer and backwardLayer:
+        if len(forwardLayer) <= len(backwardLayer):
+            forwardLayer, meeting = expandLayer(
+                forwardLayer, forwardParents, backwardParents,
+                neighbors, forwardMovies)
+        else:
+            backwardLayer, meeting = expandLayer(
+                backwardLayer, backwardParents, forwardParents,
+                neighbors, backwardMovies)
+        if meeting is not None:
+            return joinPaths(meeting, forwardParents, backwardParents)
+    return None
+
+
+def expandLayer(layer, parents, otherParents, neighbors, visitedMovies):
+    """
+    Expands every person in `layer`, recording newly reached people in
+    `parents`. Returns the next layer and the first person that is also
+    known to the other side, or None if the frontiers did not meet.
+    """
+    nextLayer = []
+    for person in layer:
+        for movie, actor in neighbors(person, visitedMovies):
+            if actor in parents:
+                continue
+            parents[actor] = (person, movie)
+            if actor in otherParents:
+                return nextLayer, actor
+            nextLayer.append(actor)
+    return nextLayer, None
+
+
+def joinPaths(meeting, forwardParents, backwardParents):
+    """
+    Builds the (movie_id, person_id) path through the meeting person
+    from the parent maps of both search directions.
+    """
+    path = []
+    person = meeting
+    while forwardParents[person] is not None:
+        parent, movie = forwardParents[person]
+        path.append((movie, person))
+        person = parent
+    path.reverse()
+
+    person = meeting
+    while backwardParents[person] is not None:
+        parent, movie = backwardParents[person]
+        path.append((movie, parent))
+        person = parent
+    return path
+
+def all_shortest_paths(source, target):
+    """
+    Yields every shortest list of (movie_id, person_id) pairs that
+    connects the source to the target, one path at a time.
+
+    Yields nothing if there is no possible path.
+    """
+    if graph is None:
+        yield from shortestPathsDag(source, target, iter_neighbors)
+        return
+    for path in shortestPathsDag(graph.person_index[source],
+                                 graph.person_index[target], graph.neighbors):
+        yield graph.path_ids(path)
+
+
+def k_shortest_paths(source, target, k=None):
+    """
+    Yields up to `k` simple lists of (movie_id, person_id) pairs that
+    connect the source to the target, shortest first. All shortest paths
+    come straight from the layered search; longer ones are found with
+    Yen's algorithm. With `k` of None, keeps going until every simple path
+    has been yielded.
+    """
+    if graph is None:
+        paths = simplePaths(source, target, iter_neighbors)
+    else:
+        paths = map(graph.path_ids,
+                    simplePaths(graph.person_index[source],
+                                graph.person_index[target], graph.neighbors))
+    return itertools.islice(paths, k)
+
+
+def shortestPathsDag(source, target, neighbors):
+    """
+    Builds the layered breadth-first DAG from source up to the layer of the
+    target and yields every path through it that ends at the target.
+    """
+    if source == target:
+        yield []
+        return
+
+    # Map each reached person to every (person, movie) one layer closer
+    depth = {source: 0}
+    parents = {source: []}
+    layer = [source]
+    while layer and target not in depth:
+        nextLayer = []
+        for person in layer:
+            childDepth = depth[person] + 1
+            for movie, actor in neighbors(person):
+                if actor not in depth:
+                    depth[actor] = childDepth
+                    parents[actor] = []
+                    nextLayer.append(actor)
+                if depth[actor] == childDepth:
+                    parents[actor].append((person, movie))
+        layer = nextLayer
+    if target not in depth:
+        return
+
+    def walk(person, suffix):
+        if person == source:
+            yield suffix[::-1]
+            return
+        for parent, movie in parents[person]:
+            suffix.append((movie, person))
+            yield from walk(parent, suffix)
+            suffix.pop()
+
+    yield from walk(target, [])
+
+
+def simplePaths(source, target, neighbors):
+    """
+    Yields simple paths from source to target in order of length using
+    Yen's algorithm, seeded with all shortest paths from the layered DAG.
+    """
+    found = []
+    # Map each path prefix to the (movie, person) steps found paths take next
+    branches = {}
+
+    def record(path):
+        found.append(path)
+        for i in range(len(path)):
+            branches.setdefault(tuple(path[:i]), set()).add(path[i])
+
+    for path in shortestPathsDag(source, target, neighbors):
+        record(path)
+        yield path
+    if not found or source == target:
+        return
+
+    seen = {tuple(path) for path in found}
+    candidates = []
+    counter = itertools.count()
+    spurred = 0
+    while True:
+        # Branch off every path that has not been used as a root yet
+        for path in found[spurred:]:
+            people = [source] + [person for _, person in path]
+            for i in range(len(path)):
+                root = path[:i]
+                spur = restrictedSearch(people[i], target, neighbors,
+                                        set(people[:i]),
+                                        branches[tuple(root)])
+                if spur is None:
+                    continue
+                candidate = tuple(root + spur)
+                if candidate not in seen:
+                    seen.add(candidate)
+                    heapq.heappush(candidates,
+                                   (len(candidate), next(counter), candidate))
+        spurred = len(found)
+
+        if not candidates:
+            return
+        _, _, path = heapq.heappop(candidates)
+        record(list(path))
+        yield list(path)
+
+
+def restrictedSearch(source, target, neighbors, bannedPeople, bannedEdges):
+    """
+    Breadth-first search from source to target that never visits a person
+    in `bannedPeople` and never takes a (movie, person) step in
+    `bannedEdges` out of the source. Returns the path or None.
+    """
+    parents = {source: None}
+    layer = [source]
+    while layer:
+        nextLayer = []
+        for person in layer:
+            for movie, actor in neighbors(person):
+                if actor in parents or actor in bannedPeople:
+                    continue
+                if person == source and (movie, actor) in bannedEdges:
+                    continue
+                parents[actor] = (person, movie)
+                if actor == target:
+                    return joinPaths(target, parents, {target: None})
+                nextLayer.append(actor)
+        layer = nextLayer
+    return None
+
+
 def createResultPath(lastNode):
     path = []
     node = lastNode
@@ -126,36 +456,95 @@ def person_id_for_name(name):
     """
     person_ids = list(names.get(name.lower(), set()))
     if len(person_ids) == 0:
-        return None
+        person_ids = find_people(name)
+        if len(person_ids) == 0:
+            return None
+        print(f"No one is called '{name}'. Did you mean:")
+        return choose_person(person_ids)
     elif len(person_ids) > 1:
         print(f"Which '{name}'?")
-        for person_id in person_ids:
-            person = people[person_id]
-            name = person["name"]
-            birth = person["birth"]
-            print(f"ID: {person_id}, Name: {name}, Birth: {birth}")
-        try:
-            person_id = input("Intended Person ID: ")
-            if person_id in person_ids:
-                return person_id
-        except ValueError:
-            pass
-        return None
+        return choose_person(person_ids)
     else:
         return person_ids[0]
 
 
+def choose_person(person_ids):
+    """
+    Lists people with their birth year and asks which one was meant.
+    """
+    for person_id in person_ids:
+        person = people[person_id]
+        name = person["name"]
+        birth = person["birth"]
+        print(f"ID: {person_id}, Name: {name}, Birth: {birth}")
+    try:
+        person_id = input("Intended Person ID: ")
+        if person_id in person_ids:
+            return person_id
+    except ValueError:
+        pass
+    return None
+
+
+def find_people(query, limit=10, prefix=False):
+    """
+    Returns up to `limit` person_ids whose names best match `query`,
+    best match first. With `prefix`, returns people whose names start
+    with `query` instead, for type-ahead. People sharing a name are
+    ordered by birth year.
+    """
+    index = name_index()
+    if prefix:
+        matches = index.prefix(query, limit)
+    else:
+        matches = [match for match, _ in index.fuzzy(query, limit)]
+
+    person_ids = []
+    for match in matches:
+        person_ids.extend(sorted(names[match],
+                                 key=lambda person_id: people[person_id]["birth"]))
+    return person_ids[:limit]
+
+
+def name_index():
+    """
+    Returns the NameIndex over all names, building it on first use so that
+    path queries by id never pay for it.
+    """
+    global nameIndex
+    if nameIndex is None:
+        nameIndex = NameIndex(names)
+    return nameIndex
+
+
 def neighbors_for_person(person_id):
     """
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
     """
-    movie_ids = people[person_id]["movies"]
-    neighbors = set()
-    for movie_id in movie_ids:
+    return set(iter_neighbors(person_id))
+
+
+def iter_neighbors(person_id, visited_movies=None):
+    """
+    Lazily yields (movie_id, person_id) pairs for people
+    who starred with a given person.
+
+    If `visited_movies` is a set, movies in it are skipped and every
+    movie whose cast is yielded is added to it.
+    """
+    if graph is not None:
+        for movie, person in graph.neighbors(graph.person_index[person_id],
+                                             visited_movies):
+            yield graph.movie_ids[movie], graph.person_ids[person]
+        return
+    for movie_id in people[person_id]["movies"]:
+        if visited_movies is not None:
+            if movie_id in visited_movies:
+                continue
+            visited_movies.add(movie_id)
         for person_id in movies[movie_id]["stars"]:
-            neighbors.add((movie_id, person_id))
-    return neighbors
+            yield movie_id, person_id
 
 
 if __name__ == "__main__":
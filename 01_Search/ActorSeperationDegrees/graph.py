@@ -0,0 +1,427 @@
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from functools import cached_property
+
+# Snapshot file layout: magic, format version, header length, JSON header,
+# then the sections listed in the header, each aligned to 8 bytes
+SNAPSHOT_MAGIC = b"DEGREES\0"
+SNAPSHOT_VERSION = 3
+SNAPSHOT_PREFIX = struct.Struct("<8sII")
+CSV_FILES = ("people.csv", "movies.csv", "stars.csv")
+STRING_TABLES = ("person_ids", "person_names", "person_births",
+                 "movie_ids", "movie_titles", "movie_years")
+INT_BUFFERS = ("person_offsets", "person_movies",
+               "movie_offsets", "movie_stars", "person_order", "movie_order")
+
+
+class CompactGraph():
+    """
+    Actor/movie graph with person and movie ids interned to dense integers.
+
+    Both directions of the bipartite person <-> movie graph are stored
+    CSR-style: the movies of person `p` are
+    `person_movies[person_offsets[p]:person_offsets[p + 1]]`, and the stars
+    of movie `m` are `movie_stars[movie_offsets[m]:movie_offsets[m + 1]]`.
+    The buffers are memoryviews of 32-bit integers, so slicing them does not
+    copy any data. Ids, names, births, titles and years are StringTables.
+    `person_order` and `movie_order` list the indices sorted by id, for
+    looking ids up without building a dictionary.
+    """
+
+    def __init__(self, person_ids, person_names, person_births,
+                 movie_ids, movie_titles, movie_years,
+                 person_offsets, person_movies, movie_offsets, movie_stars,
+                 person_order, movie_order):
+        self.person_ids = person_ids
+        self.person_names = person_names
+        self.person_births = person_births
+        self.movie_ids = movie_ids
+        self.movie_titles = movie_titles
+        self.movie_years = movie_years
+        self.person_offsets = memoryview(person_offsets)
+        self.person_movies = memoryview(person_movies)
+        self.movie_offsets = memoryview(movie_offsets)
+        self.movie_stars = memoryview(movie_stars)
+        self.person_order = memoryview(person_order)
+        self.movie_order = memoryview(movie_order)
+        self.person_index = SortedIndex(person_ids, self.person_order)
+        self.movie_index = SortedIndex(movie_ids, self.movie_order)
+
+    @classmethod
+    def from_csv(cls, directory):
+        """
+        Builds the graph from the people, movies and stars CSV files.
+        """
+        person_ids, person_names, person_births = (
+            StringTable(), StringTable(), StringTable())
+        person_index = {}
+        with open(f"{directory}/people.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                person_index[row["id"]] = len(person_ids)
+                person_ids.append(row["id"])
+                person_names.append(row["name"])
+                person_births.append(row["birth"])
+
+        movie_ids, movie_titles, movie_years = (
+            StringTable(), StringTable(), StringTable())
+        movie_index = {}
+        with open(f"{directory}/movies.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                movie_index[row["id"]] = len(movie_ids)
+                movie_ids.append(row["id"])
+                movie_titles.append(row["title"])
+                movie_years.append(row["year"])
+
+        # Collect edges, skipping rows that reference unknown ids
+        edge_people = array("i")
+        edge_movies = array("i")
+        with open(f"{directory}/stars.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                person = person_index.get(row["person_id"])
+                movie = movie_index.get(row["movie_id"])
+                if person is None or movie is None:
+                    continue
+                edge_people.append(person)
+                edge_movies.append(movie)
+
+        person_offsets, person_movies = build_csr(
+            len(person_ids), edge_people, edge_movies)
+        movie_offsets, movie_stars = build_csr(
+            len(movie_ids), edge_movies, edge_people)
+
+        # Ids compare like their UTF-8 bytes, which SortedIndex relies on
+        person_order = array("i", (person_index[person_id]
+                                   for person_id in sorted(person_index)))
+        movie_order = array("i", (movie_index[movie_id]
+                                  for movie_id in sorted(movie_index)))
+
+        return cls(person_ids, person_names, person_births,
+                   movie_ids, movie_titles, movie_years,
+                   person_offsets, person_movies, movie_offsets, movie_stars,
+                   person_order, movie_order)
+
+    @classmethod
+    def from_snapshot(cls, path, key):
+        """
+        Memory-maps a snapshot written by `save_snapshot`.
+        Returns None if the file is missing, of another format version,
+        or was built from different CSV files than `key` describes.
+        """
+        try:
+            with open(path, "rb") as f:
+                snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            magic, version, headerLength = SNAPSHOT_PREFIX.unpack_from(
+                snapshot)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                return None
+            start = SNAPSHOT_PREFIX.size
+            header = json.loads(snapshot[start:start + headerLength])
+        except (struct.error, ValueError):
+            return None
+        if header["key"] != key:
+            return None
+
+        view = memoryview(snapshot)
+        sections = header["sections"]
+        if any(section[0] + section[1] > len(view)
+               for section in sections.values()):
+            return None
+        tables = {}
+        for name in STRING_TABLES:
+            offset, length = sections[name]
+            offsetsOffset, offsetsLength = sections[name + "_offsets"]
+            tables[name] = StringTable(
+                view[offset:offset + length],
+                view[offsetsOffset:offsetsOffset + offsetsLength].cast("q"))
+        buffers = {}
+        for name in INT_BUFFERS:
+            offset, length = sections[name]
+            buffers[name] = view[offset:offset + length].cast("i")
+
+        graph = cls(**tables, **buffers)
+        graph.snapshot = snapshot
+        return graph
+
+    def save_snapshot(self, path, key):
+        """
+        Writes the graph to a binary snapshot at `path` tagged with `key`.
+        The file is written under a temporary name and then moved into
+        place, so readers never see a partial snapshot.
+        """
+        sections = {}
+        chunks = []
+        position = 0
+
+        def append(data):
+            nonlocal position
+            padding = -position % 8
+            chunks.append(bytes(padding))
+            chunks.append(data)
+            position += padding
+            offset = position
+            position += len(data)
+            return offset
+
+        for name in STRING_TABLES:
+            table = getattr(self, name)
+            data = bytes(table.data)
+            offsets = table.offsets.tobytes()
+            sections[name] = [append(data), len(data)]
+            sections[name + "_offsets"] = [append(offsets), len(offsets)]
+        for name in INT_BUFFERS:
+            data = getattr(self, name).tobytes()
+            sections[name] = [append(data), len(data)]
+
+        # Section offsets so far are relative to the end of the header;
+        # grow the reserved header space until the shifted offsets fit
+        base = SNAPSHOT_PREFIX.size
+        while True:
+            shifted = {name: [section[0] + base] + section[1:]
+                       for name, section in sections.items()}
+            headerBytes = json.dumps(
+                {"key": key, "sections": shifted}).encode("utf-8")
+            if SNAPSHOT_PREFIX.size + len(headerBytes) <= base:
+                break
+            base = SNAPSHOT_PREFIX.size + len(headerBytes)
+            base += -base % 8
+        headerBytes += b" " * (base - SNAPSHOT_PREFIX.size - len(headerBytes))
+
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(SNAPSHOT_PREFIX.pack(
+                SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(headerBytes)))
+            f.write(headerBytes)
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temporary, path)
+
+    def movies_of(self, person):
+        """
+        Returns a view of the movie indices a person starred in.
+        """
+        offsets = self.person_offsets
+        return self.person_movies[offsets[person]:offsets[person + 1]]
+
+    def stars_of(self, movie):
+        """
+        Returns a view of the person indices that starred in a movie.
+        """
+        offsets = self.movie_offsets
+        return self.movie_stars[offsets[movie]:offsets[movie + 1]]
+
+    def neighbors(self, person, visited_movies=None):
+        """
+        Yields (movie, person) index pairs for people who starred
+        with a given person.
+
+        If `visited_movies` is a set, movies in it are skipped and every
+        movie whose cast is yielded is added to it.
+        """
+        for movie in self.movies_of(person):
+            if visited_movies is not None:
+                if movie in visited_movies:
+                    continue
+                visited_movies.add(movie)
+            for star in self.stars_of(movie):
+                yield movie, star
+
+    def path_ids(self, path):
+        """
+        Translates a path of (movie, person) indices back to ids.
+        """
+        return [(self.movie_ids[movie], self.person_ids[person])
+                for movie, person in path]
+
+
+class StringTable(Sequence):
+    """
+    Strings stored back to back in one UTF-8 buffer: string i is
+    `data[offsets[i]:offsets[i + 1]]`. Strings are only decoded when they
+    are read, so the table keeps no Python object per string.
+    """
+
+    def __init__(self, data=None, offsets=None):
+        self.data = bytearray() if data is None else data
+        self.offsets = array("q", [0]) if offsets is None else offsets
+
+    def append(self, string):
+        self.data += string.encode("utf-8")
+        self.offsets.append(len(self.data))
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("string table index out of range")
+        return str(self.data[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        data, offsets = self.data, self.offsets
+        for i in range(len(offsets) - 1):
+            yield str(data[offsets[i]:offsets[i + 1]], "utf-8")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def encoded(self, i):
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]])
+
+
+class SortedIndex(Mapping):
+    """
+    Maps the strings of a StringTable to their index, by binary search over
+    `order`, the indices sorted by string.
+    """
+
+    def __init__(self, strings, order):
+        self.strings = strings
+        self.order = order
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            raise KeyError(key)
+        target = key.encode("utf-8")
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.strings.encoded(self.order[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.order):
+            index = self.order[low]
+            if self.strings.encoded(index) == target:
+                return index
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.strings)
+
+    def __len__(self):
+        return len(self.order)
+
+
+def snapshot_key(directory):
+    """
+    Describes the CSV files in `directory` by size and modification time,
+    so a snapshot can tell whether it is still up to date.
+    """
+    files = {}
+    for filename in CSV_FILES:
+        stat = os.stat(os.path.join(directory, filename))
+        files[filename] = [stat.st_size, stat.st_mtime_ns]
+    return {"files": files, "byteorder": sys.byteorder}
+
+
+def build_csr(count, sources, targets):
+    """
+    Groups the edges `sources[i] -> targets[i]` by source.
+    Returns the (offsets, targets) arrays of the CSR layout.
+    """
+    offsets = array("i", bytes(4 * (count + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for i in range(count):
+        offsets[i + 1] += offsets[i]
+
+    cursor = offsets[:-1]
+    grouped = array("i", bytes(4 * len(targets)))
+    for source, target in zip(sources, targets):
+        grouped[cursor[source]] = target
+        cursor[source] += 1
+    return offsets, grouped
+
+
+class PeopleView(Mapping):
+    """
+    Read-only view of a CompactGraph that looks like the `people`
+    dictionary of degrees.py.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, person_id):
+        graph = self.graph
+        person = graph.person_index[person_id]
+        return {
+            "name": graph.person_names[person],
+            "birth": graph.person_births[person],
+            "movies": {graph.movie_ids[movie]
+                       for movie in graph.movies_of(person)}
+        }
+
+    def __contains__(self, person_id):
+        return person_id in self.graph.person_index
+
+    def __iter__(self):
+        return iter(self.graph.person_ids)
+
+    def __len__(self):
+        return len(self.graph.person_ids)
+
+
+class MoviesView(Mapping):
+    """
+    Read-only view of a CompactGraph that looks like the `movies`
+    dictionary of degrees.py.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, movie_id):
+        graph = self.graph
+        movie = graph.movie_index[movie_id]
+        return {
+            "title": graph.movie_titles[movie],
+            "year": graph.movie_years[movie],
+            "stars": {graph.person_ids[person]
+                      for person in graph.stars_of(movie)}
+        }
+
+    def __contains__(self, movie_id):
+        return movie_id in self.graph.movie_index
+
+    def __iter__(self):
+        return iter(self.graph.movie_ids)
+
+    def __len__(self):
+        return len(self.graph.movie_ids)
+
+
+class NamesView(Mapping):
+    """
+    Read-only view of a CompactGraph that looks like the `names`
+    dictionary of degrees.py. The lookup table is built on first use.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    @cached_property
+    def index(self):
+        index = {}
+        for person_id, name in zip(self.graph.person_ids,
+                                   self.graph.person_names):
+            index.setdefault(name.lower(), set()).add(person_id)
+        return index
+
+    def __getitem__(self, name):
+        return self.index[name]
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
@@ -0,0 +1,229 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from graph import snapshot_key
+
+# Hub table file layout: magic, format version, header length, JSON header,
+# then one distance byte per person (padded to 8 bytes) followed by the
+# parent person and parent movie of every person as 32-bit integers
+HUB_MAGIC = b"DEGHUB\0\0"
+HUB_VERSION = 1
+HUB_PREFIX = struct.Struct("<8sII")
+HUB_DIRECTORY = "hubs"
+HUB_SUFFIX = ".hub"
+
+# Distance stored for people that cannot reach the hub
+UNREACHABLE = 255
+
+
+def main():
+    # degrees.py imports this module, so only import it when run as a script
+    import degrees
+
+    parser = argparse.ArgumentParser(
+        description="Precompute distance tables for hub actors."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("hubs", nargs="+", metavar="hub",
+                        help="person id or unambiguous name of a hub actor")
+    args = parser.parse_args()
+
+    print("Loading data...")
+    degrees.load_data(args.directory, compact=True)
+    print("Data loaded.")
+
+    for hub in args.hubs:
+        person_ids = ([hub] if hub in degrees.people
+                      else sorted(degrees.names.get(hub.lower(), set())))
+        if len(person_ids) != 1:
+            sys.exit(f"Person not found or ambiguous: {hub}")
+        path = save_hub_table(args.directory, degrees.graph, person_ids[0])
+        print(f"Wrote {path}")
+
+
+def single_source_tables(graph, source):
+    """
+    Breadth-first search over a CompactGraph from the person index `source`.
+    Returns (distances, parent_people, parent_movies) arrays indexed by
+    person: the number of degrees to the source, and the person and movie
+    one step closer to the source (-1 for the source and unreachable people).
+    """
+    count = len(graph.person_ids)
+    distances = array("B", bytes([UNREACHABLE])) * count
+    parent_people = array("i", [-1]) * count
+    parent_movies = array("i", [-1]) * count
+
+    distances[source] = 0
+    layer = [source]
+    visitedMovies = set()
+    distance = 0
+    while layer:
+        distance += 1
+        if distance >= UNREACHABLE:
+            raise ValueError("graph is too deep for hub tables")
+        nextLayer = []
+        for person in layer:
+            for movie, star in graph.neighbors(person, visitedMovies):
+                if distances[star] != UNREACHABLE:
+                    continue
+                distances[star] = distance
+                parent_people[star] = person
+                parent_movies[star] = movie
+                nextLayer.append(star)
+        layer = nextLayer
+    return distances, parent_people, parent_movies
+
+
+def hub_table_key(graph, key):
+    """
+    Identifies the graph a table was computed for: the CSV snapshot key
+    plus the number of people, since tables are indexed by person index.
+    """
+    return {"data": key, "people": len(graph.person_ids)}
+
+
+def save_hub_table(directory, graph, person_id):
+    """
+    Computes the table for the hub `person_id` and writes it to the hubs
+    directory next to the CSV files. Returns the path of the table.
+    """
+    tables = single_source_tables(graph, graph.person_index[person_id])
+    header = json.dumps({
+        "key": hub_table_key(graph, snapshot_key(directory)),
+        "hub": person_id
+    }).encode("utf-8")
+    header += b" " * (-(HUB_PREFIX.size + len(header)) % 8)
+
+    os.makedirs(os.path.join(directory, HUB_DIRECTORY), exist_ok=True)
+    path = hub_path(directory, person_id)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(HUB_PREFIX.pack(HUB_MAGIC, HUB_VERSION, len(header)))
+        f.write(header)
+        distances, parent_people, parent_movies = tables
+        f.write(distances.tobytes())
+        f.write(bytes(-len(distances) % 8))
+        f.write(parent_people.tobytes())
+        f.write(parent_movies.tobytes())
+    os.replace(temporary, path)
+    return path
+
+
+def hub_path(directory, person_id):
+    return os.path.join(directory, HUB_DIRECTORY, person_id + HUB_SUFFIX)
+
+
+class HubTable():
+    """
+    Memory-mapped distance and parent pointer table of one hub actor.
+    """
+
+    def __init__(self, path, key):
+        with open(path, "rb") as f:
+            self.table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, headerLength = HUB_PREFIX.unpack_from(self.table)
+        if magic != HUB_MAGIC or version != HUB_VERSION:
+            raise ValueError(f"{path} is not a hub table")
+        start = HUB_PREFIX.size
+        header = json.loads(self.table[start:start + headerLength])
+        if header["key"] != key:
+            raise ValueError(f"{path} was computed for other data")
+
+        count = key["people"]
+        offset = start + headerLength
+        view = memoryview(self.table)
+        self.distances = view[offset:offset + count]
+        offset += count + (-count % 8)
+        self.parent_people = view[offset:offset + 4 * count].cast("i")
+        offset += 4 * count
+        self.parent_movies = view[offset:offset + 4 * count].cast("i")
+
+    def path_to_hub(self, person):
+        """
+        Returns the (movie, person) index pairs leading from `person` to the
+        hub, or None if they are not connected.
+        """
+        if self.distances[person] == UNREACHABLE:
+            return None
+        path = []
+        while self.parent_people[person] != -1:
+            movie = self.parent_movies[person]
+            person = self.parent_people[person]
+            path.append((movie, person))
+        return path
+
+    def path_from_hub(self, person):
+        """
+        Returns the (movie, person) index pairs leading from the hub to
+        `person`, or None if they are not connected.
+        """
+        if self.distances[person] == UNREACHABLE:
+            return None
+        path = []
+        while self.parent_people[person] != -1:
+            path.append((self.parent_movies[person], person))
+            person = self.parent_people[person]
+        path.reverse()
+        return path
+
+
+class HubTables():
+    """
+    The hub tables found next to the CSV files of a CompactGraph.
+    Tables are only opened the first time a query touches their hub.
+    """
+
+    def __init__(self, directory, graph, key):
+        self.directory = directory
+        self.graph = graph
+        self.key = hub_table_key(graph, key)
+        self.tables = {}
+
+        self.hubs = {}
+        try:
+            filenames = os.listdir(os.path.join(directory, HUB_DIRECTORY))
+        except OSError:
+            filenames = []
+        for filename in filenames:
+            if filename.endswith(HUB_SUFFIX):
+                person_id = filename[:-len(HUB_SUFFIX)]
+                if person_id in graph.person_index:
+                    self.hubs[graph.person_index[person_id]] = person_id
+
+    def table(self, person):
+        """
+        Returns the HubTable of the person index `person`, or None if
+        they are not a hub or their table is unusable.
+        """
+        if person not in self.hubs:
+            return None
+        if person not in self.tables:
+            try:
+                self.tables[person] = HubTable(
+                    hub_path(self.directory, self.hubs[person]), self.key)
+            except (OSError, ValueError, struct.error):
+                self.tables[person] = None
+        return self.tables[person]
+
+    def shortest_path(self, source, target):
+        """
+        Looks up a shortest path between person indices if either of them
+        is a hub. Returns (True, path) when answered from a table, where
+        path may be None if they are not connected, else (False, None).
+        """
+        table = self.table(target)
+        if table is not None:
+            return True, table.path_to_hub(source)
+        table = self.table(source)
+        if table is not None:
+            return True, table.path_from_hub(target)
+        return False, None
+
+
+if __name__ == "__main__":
+    main()
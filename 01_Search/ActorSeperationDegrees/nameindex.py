@@ -0,0 +1,92 @@
+import bisect
+import difflib
+from array import array
+from collections import Counter
+
+# Postings longer than this are only counted if a query has no rarer trigrams
+COMMON_TRIGRAM = 50000
+
+# Number of trigram candidates re-ranked by edit similarity
+RERANK = 20
+
+# Fuzzy matches scoring lower than this are not returned
+MIN_SCORE = 0.5
+
+
+class NameIndex():
+    """
+    Prefix and trigram index over lowercase names.
+
+    Prefix lookups binary search a sorted list of names. Fuzzy lookups
+    collect candidates sharing trigrams with the query, keep the ones with
+    the best Dice coefficient and re-rank those by edit similarity.
+    """
+
+    def __init__(self, names):
+        self.keys = sorted(names)
+        self.sizes = array("H")
+        self.postings = {}
+        for i, key in enumerate(self.keys):
+            keyTrigrams = set(trigrams(key))
+            self.sizes.append(min(len(keyTrigrams), 0xFFFF))
+            for trigram in keyTrigrams:
+                posting = self.postings.get(trigram)
+                if posting is None:
+                    posting = self.postings[trigram] = array("i")
+                posting.append(i)
+
+    def prefix(self, query, limit=10):
+        """
+        Returns up to `limit` names starting with `query`, in sorted order.
+        """
+        query = query.lower()
+        matches = []
+        i = bisect.bisect_left(self.keys, query)
+        while (i < len(self.keys) and len(matches) < limit
+               and self.keys[i].startswith(query)):
+            matches.append(self.keys[i])
+            i += 1
+        return matches
+
+    def fuzzy(self, query, limit=10):
+        """
+        Returns up to `limit` (name, score) pairs for the names most similar
+        to `query`, best first, with scores between MIN_SCORE and 1.
+        """
+        query = query.lower()
+        queryTrigrams = set(trigrams(query))
+        if not queryTrigrams:
+            return []
+
+        postings = [self.postings[trigram] for trigram in queryTrigrams
+                    if trigram in self.postings]
+        rare = [posting for posting in postings
+                if len(posting) <= COMMON_TRIGRAM]
+        shared = Counter()
+        for posting in rare or postings:
+            shared.update(posting)
+
+        def dice(i):
+            return 2 * shared[i] / (self.sizes[i] + len(queryTrigrams))
+
+        candidates = [i for i, _ in shared.most_common(RERANK * 4)]
+        candidates = sorted(candidates, key=dice, reverse=True)[:RERANK]
+
+        scored = []
+        for i in candidates:
+            key = self.keys[i]
+            similarity = difflib.SequenceMatcher(None, query, key).ratio()
+            score = round((similarity + dice(i)) / 2, 3)
+            if score >= MIN_SCORE:
+                scored.append((key, score))
+        scored.sort(key=lambda match: (-match[1], match[0]))
+        return scored[:limit]
+
+
+def trigrams(text):
+    """
+    Returns the trigrams of `text`, padded so that the start and end of
+    the text form trigrams of their own.
+    """
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
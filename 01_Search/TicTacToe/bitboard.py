@@ -0,0 +1,379 @@
+"""
+Bitboard Tic Tac Toe engine
+
+A board is a pair of integers (x, o) with bit `width * i + j` set when
+cell (i, j) holds that player's mark. A Game describes the board size and
+the number of marks in a row needed to win, and searches positions.
+"""
+
+import math
+import time
+
+X = "X"
+O = "O"
+EMPTY = None
+
+# Kinds of values in the transposition table
+EXACT = "exact"
+LOWER = "lower"
+UPPER = "upper"
+
+# Value of a won position; heuristic evaluations stay well below it
+WIN = 1000000
+
+# Check the clock every this many nodes
+CLOCK_INTERVAL = 256
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when its time budget is used up."""
+
+
+class SearchCancelled(Exception):
+    """Raised by Game.minimax when its search was cancelled."""
+
+
+class Game():
+    """
+    An m,n,k-game: `height` x `width` board, `k` in a row wins.
+    Keeps the precomputed masks and the transposition table of the game.
+    """
+
+    def __init__(self, height=3, width=3, k=3):
+        self.height = height
+        self.width = width
+        self.k = k
+        self.cells = height * width
+        self.full = (1 << self.cells) - 1
+
+        # Masks of every run of k cells in a row, column or diagonal
+        self.lines = []
+        for i in range(height):
+            for j in range(width):
+                for di, dj in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    cells = [(i + di * step, j + dj * step)
+                             for step in range(k)]
+                    if all(0 <= a < height and 0 <= b < width
+                           for a, b in cells):
+                        self.lines.append(sum(1 << self.bit(a, b)
+                                              for a, b in cells))
+        self.linesThrough = [[line for line in self.lines if line >> bit & 1]
+                             for bit in range(self.cells)]
+
+        # Cells on more lines first: for 3x3 the centre, corners, then edges
+        self.moveOrder = sorted(range(self.cells),
+                                key=lambda bit: -len(self.linesThrough[bit]))
+
+        # For each symmetry the position every bit moves to, its inverse,
+        # and byte tables that move 8 bits of a mask at a time
+        self.permutations = []
+        self.inverses = []
+        self.symmetryTables = []
+        for cells in symmetries(height, width):
+            permutation = [0] * self.cells
+            for position, (i, j) in enumerate(cells):
+                permutation[self.bit(i, j)] = position
+            inverse = [0] * self.cells
+            for bit, position in enumerate(permutation):
+                inverse[position] = bit
+            tables = []
+            for shift in range(0, self.cells, 8):
+                table = []
+                for byte in range(256):
+                    permuted = 0
+                    for offset in range(8):
+                        bit = shift + offset
+                        if byte >> offset & 1 and bit < self.cells:
+                            permuted |= 1 << permutation[bit]
+                    table.append(permuted)
+                tables.append(table)
+            self.permutations.append(permutation)
+            self.inverses.append(inverse)
+            self.symmetryTables.append(tables)
+
+        # Maps canonical keys to (value, bound, depth, best bit or None)
+        self.transpositions = {}
+        self.history = {}
+        self.searchStats = {"nodes": 0, "hits": 0, "depth": 0}
+        self.deadline = None
+        self.cancel = None
+
+    def bit(self, i, j):
+        return self.width * i + j
+
+    def cell(self, bit):
+        return divmod(bit, self.width)
+
+    def from_board(self, board):
+        """
+        Converts a list-of-lists board into (x, o) masks.
+        """
+        x = o = 0
+        for i, row in enumerate(board):
+            for j, cell in enumerate(row):
+                if cell == X:
+                    x |= 1 << self.bit(i, j)
+                elif cell == O:
+                    o |= 1 << self.bit(i, j)
+        return x, o
+
+    def to_board(self, x, o):
+        """
+        Converts (x, o) masks into a list-of-lists board.
+        """
+        board = [[EMPTY] * self.width for _ in range(self.height)]
+        for bit in range(self.cells):
+            i, j = self.cell(bit)
+            if x >> bit & 1:
+                board[i][j] = X
+            elif o >> bit & 1:
+                board[i][j] = O
+        return board
+
+    def player(self, x, o):
+        """
+        Returns player who has the next turn.
+        """
+        return X if bin(x).count("1") <= bin(o).count("1") else O
+
+    def actions(self, x, o):
+        """
+        Returns the bits of all empty cells.
+        """
+        empty = self.full & ~(x | o)
+        return [bit for bit in range(self.cells) if empty >> bit & 1]
+
+    def result(self, x, o, bit):
+        """
+        Returns the (x, o) masks after the player to move marks cell `bit`.
+        """
+        if (x | o) >> bit & 1:
+            raise ValueError("cell is not empty")
+        if self.player(x, o) == X:
+            return x | 1 << bit, o
+        return x, o | 1 << bit
+
+    def has_line(self, mask, lines=None):
+        for line in self.lines if lines is None else lines:
+            if mask & line == line:
+                return True
+        return False
+
+    def winner(self, x, o):
+        """
+        Returns the winner of the game, if there is one.
+        """
+        if self.has_line(x):
+            return X
+        if self.has_line(o):
+            return O
+        return None
+
+    def terminal(self, x, o):
+        """
+        Returns True if game is over, False otherwise.
+        """
+        return (x | o) == self.full or self.has_line(x) or self.has_line(o)
+
+    def utility(self, x, o):
+        """
+        Returns 1 if X has won the game, -1 if O has won, 0 otherwise.
+        """
+        if self.has_line(x):
+            return 1
+        if self.has_line(o):
+            return -1
+        return 0
+
+    def canonical(self, me, them):
+        """
+        Returns (key, symmetry) for a position: the smallest key of all its
+        rotations and reflections, and the index of the symmetry giving it.
+        """
+        best = None
+        for index, tables in enumerate(self.symmetryTables):
+            key = 0
+            for chunk, table in enumerate(tables):
+                key |= (table[me >> (8 * chunk) & 0xFF]
+                        | table[them >> (8 * chunk) & 0xFF] << self.cells)
+            if best is None or key < best[0]:
+                best = (key, index)
+        return best
+
+    def evaluate(self, me, them):
+        """
+        Heuristic value of a position for the player owning `me`: every line
+        still open to only one player counts for that player, more so the
+        more of its cells they hold.
+        """
+        score = 0
+        for line in self.lines:
+            mine = me & line
+            theirs = them & line
+            if mine and not theirs:
+                score += 4 ** bin(mine).count("1")
+            elif theirs and not mine:
+                score -= 4 ** bin(theirs).count("1")
+        return score
+
+    def minimax(self, x, o, budget_ms=None, cancel=None):
+        """
+        Returns the bit of the best move for the player to move. Without a
+        budget the game is searched to the end and the move is optimal;
+        with `budget_ms`, iterative deepening returns the best move of the
+        deepest search that finished within that many milliseconds.
+
+        `cancel` may be a threading.Event; once it is set, the search
+        stops soon after and raises SearchCancelled.
+        """
+        self.searchStats.update(nodes=0, hits=0, depth=0)
+        me, them = (x, o) if self.player(x, o) == X else (o, x)
+        empty = self.cells - bin(me | them).count("1")
+        if empty == 0 or self.has_line(me) or self.has_line(them):
+            return None
+
+        self.cancel = cancel
+        if budget_ms is None:
+            self.deadline = None
+            depths = [empty]
+        else:
+            self.deadline = time.perf_counter() + budget_ms / 1000
+            depths = range(1, empty + 1)
+        bestBit = self.ordered(me | them, None, 0)[0]
+        try:
+            for depth in depths:
+                bestBit = self.root(me, them, depth)
+                self.searchStats["depth"] = depth
+        except SearchTimeout:
+            if cancel is not None and cancel.is_set():
+                raise SearchCancelled()
+        finally:
+            self.deadline = None
+            self.cancel = None
+        return bestBit
+
+    def root(self, me, them, depth):
+        """
+        Searches every move at the root to `depth` plies, best known move
+        first, and returns the best one.
+        """
+        key, symmetry = self.canonical(me, them)
+        entry = self.transpositions.get(key)
+        best = -math.inf
+        bestBit = None
+        for bit in self.ordered(me | them, entry, symmetry):
+            value = -self.negamax(them, me | 1 << bit, bit, depth - 1,
+                                  -math.inf, -best)
+            if value > best:
+                best = value
+                bestBit = bit
+        self.store(key, symmetry, best, EXACT, depth, bestBit)
+        return bestBit
+
+    def negamax(self, me, them, last, depth, alpha, beta):
+        """
+        Returns the value of the position for the player to move, who owns
+        the `me` mask, after the opponent marked bit `last`. Searches
+        `depth` more plies within the (alpha, beta) window.
+        """
+        stats = self.searchStats
+        stats["nodes"] += 1
+        if stats["nodes"] % CLOCK_INTERVAL == 0 and (
+                (self.cancel is not None and self.cancel.is_set())
+                or (self.deadline is not None
+                    and time.perf_counter() > self.deadline)):
+            raise SearchTimeout()
+
+        if self.has_line(them, self.linesThrough[last]):
+            return -WIN
+        occupied = me | them
+        if occupied == self.full:
+            return 0
+        if depth <= 0:
+            return self.evaluate(me, them)
+
+        key, symmetry = self.canonical(me, them)
+        entry = self.transpositions.get(key)
+        if entry is not None and entry[2] >= depth:
+            value, bound = entry[0], entry[1]
+            if (bound == EXACT
+                    or (bound == LOWER and value >= beta)
+                    or (bound == UPPER and value <= alpha)):
+                stats["hits"] += 1
+                return value
+
+        originalAlpha = alpha
+        best = -math.inf
+        bestBit = None
+        for bit in self.ordered(occupied, entry, symmetry):
+            value = -self.negamax(them, me | 1 << bit, bit, depth - 1,
+                                  -beta, -alpha)
+            if value > best:
+                best = value
+                bestBit = bit
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        self.history[bit] = (self.history.get(bit, 0)
+                                             + depth * depth)
+                        break
+
+        if best <= originalAlpha:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.store(key, symmetry, best, bound, depth, bestBit)
+        return best
+
+    def ordered(self, occupied, entry, symmetry):
+        """
+        Returns the empty cells in search order: the best move stored for
+        the position, then by history score and static cell order.
+        """
+        best = None
+        if entry is not None and entry[3] is not None:
+            best = self.inverses[symmetry][entry[3]]
+        moves = [bit for bit in self.moveOrder if not occupied >> bit & 1]
+        history = self.history
+        moves.sort(key=lambda bit: (bit != best, -history.get(bit, 0)))
+        return moves
+
+    def store(self, key, symmetry, value, bound, depth, bit):
+        """
+        Caches a search result, with the best move in canonical cells.
+        """
+        if bit is not None:
+            bit = self.permutations[symmetry][bit]
+        self.transpositions[key] = (value, bound, depth, bit)
+
+
+def symmetries(height, width):
+    """
+    Returns the rotations and reflections that map a height x width board
+    onto itself, each as the list of (i, j) cells that end up at positions
+    0, 1, ... in row-major order: 8 for square boards, 4 otherwise.
+    """
+    result = []
+    if height == width:
+        n = height
+        for rotations in range(4):
+            for reflect in (False, True):
+                cells = []
+                for i in range(n):
+                    for j in range(n):
+                        a, b = (i, n - 1 - j) if reflect else (i, j)
+                        for _ in range(rotations):
+                            a, b = b, n - 1 - a
+                        cells.append((a, b))
+                result.append(cells)
+    else:
+        for flipRows in (False, True):
+            for flipColumns in (False, True):
+                result.append([
+                    (height - 1 - i if flipRows else i,
+                     width - 1 - j if flipColumns else j)
+                    for i in range(height) for j in range(width)
+                ])
+    return result
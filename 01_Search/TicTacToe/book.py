@@ -0,0 +1,200 @@
+"""
+Solved-game table for 3x3 Tic Tac Toe
+
+Every board reachable in a game has an entry at its base-3 code (EMPTY 0,
+X 1, O 2, cells in row-major order). An entry is 16 bits: bit 15 is set
+for reachable boards, bits 9-10 hold the minimax value plus one and bits
+0-8 the cells of all optimal moves.
+"""
+
+import argparse
+import os
+import sys
+import time
+from array import array
+
+import bitboard
+
+BOOK_MAGIC = b"TTTBOOK\0"
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "book.bin")
+
+PRESENT = 1 << 15
+VALUE_SHIFT = 9
+MOVES_MASK = 0x1FF
+
+game = bitboard.Game(3, 3, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write or check the solved 3x3 Tic Tac Toe table."
+    )
+    parser.add_argument("--output", default=BOOK_FILE)
+    parser.add_argument("--check", action="store_true",
+                        help="check the search engines against the table "
+                             "instead of writing it")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(1 if check(Book.load(args.output)) else 0)
+
+    entries = solve()
+    save(args.output, entries)
+    print(f"Wrote {sum(1 for entry in entries if entry)} positions "
+          f"to {args.output}")
+
+
+def code(x, o):
+    """
+    Returns the base-3 code of a board given as bitboard masks.
+    """
+    result = 0
+    for bit in range(game.cells):
+        if x >> bit & 1:
+            result = result * 3 + 1
+        elif o >> bit & 1:
+            result = result * 3 + 2
+        else:
+            result = result * 3
+    return result
+
+
+def board_for(code):
+    """
+    Returns the list-of-lists board with the given base-3 code.
+    """
+    x = o = 0
+    for bit in reversed(range(game.cells)):
+        code, cell = divmod(code, 3)
+        if cell == 1:
+            x |= 1 << bit
+        elif cell == 2:
+            o |= 1 << bit
+    return game.to_board(x, o)
+
+
+def solve():
+    """
+    Solves every reachable board and returns the table entries.
+    """
+    entries = array("H", bytes(2 * 3 ** game.cells))
+    values = {}
+
+    def value(x, o):
+        # Minimax value for X, remembering the boards already solved
+        if (x, o) in values:
+            return values[(x, o)]
+        moves = 0
+        if game.terminal(x, o):
+            result = game.utility(x, o)
+        else:
+            actions = game.actions(x, o)
+            results = [value(*game.result(x, o, bit)) for bit in actions]
+            if game.player(x, o) == bitboard.X:
+                result = max(results)
+            else:
+                result = min(results)
+            for bit, childValue in zip(actions, results):
+                if childValue == result:
+                    moves |= 1 << bit
+        entries[code(x, o)] = PRESENT | (result + 1) << VALUE_SHIFT | moves
+        values[(x, o)] = result
+        return result
+
+    value(0, 0)
+    return entries
+
+
+def save(path, entries):
+    """
+    Writes the table entries as little-endian 16-bit integers.
+    """
+    if sys.byteorder != "little":
+        entries = array("H", entries)
+        entries.byteswap()
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(BOOK_MAGIC)
+        f.write(entries.tobytes())
+    os.replace(temporary, path)
+
+
+class Book():
+    """
+    The solved-game table, looked up by list-of-lists board.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    @classmethod
+    def load(cls, path=BOOK_FILE):
+        """
+        Reads a table written by save. Raises OSError if it is missing and
+        ValueError if it is not a table.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        if (not data.startswith(BOOK_MAGIC)
+                or len(data) != len(BOOK_MAGIC) + 2 * 3 ** game.cells):
+            raise ValueError(f"{path} is not a Tic Tac Toe table")
+        entries = array("H")
+        entries.frombytes(data[len(BOOK_MAGIC):])
+        if sys.byteorder != "little":
+            entries.byteswap()
+        return cls(entries)
+
+    def lookup(self, board):
+        """
+        Returns (value, actions) for a 3x3 board: its minimax value for X
+        and the set of all optimal actions, empty if the game is over.
+        Returns None for boards that cannot occur in a game.
+        """
+        entry = self.entries[code(*game.from_board(board))]
+        if not entry & PRESENT:
+            return None
+        actions = {game.cell(bit) for bit in range(game.cells)
+                   if entry >> bit & 1}
+        return (entry >> VALUE_SHIFT & 3) - 1, actions
+
+    def best_move(self, board):
+        """
+        Returns an optimal action for the board, preferring the centre,
+        then corners, then edges, or None if the table has no move.
+        """
+        entry = self.entries[code(*game.from_board(board))]
+        for bit in game.moveOrder:
+            if entry >> bit & 1:
+                return game.cell(bit)
+        return None
+
+
+def check(book):
+    """
+    Runs both search engines on every position of the table and reports
+    actions that are not optimal. Returns the number of mismatches.
+    """
+    import tictactoe as ttt
+
+    ttt.configure(3, 3, 3)
+    mismatches = 0
+    for engine in ("bitboard", "list"):
+        start = time.perf_counter()
+        positions = 0
+        for index, entry in enumerate(book.entries):
+            if not entry & PRESENT or not entry & MOVES_MASK:
+                continue
+            board = board_for(index)
+            action = ttt.minimax(board, engine=engine, use_book=False)
+            positions += 1
+            if action not in book.lookup(board)[1]:
+                mismatches += 1
+                print(f"{engine}: {action} is not optimal on {board}")
+        print(f"{engine}: checked {positions} positions in "
+              f"{time.perf_counter() - start:.2f}s")
+    return mismatches
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,24 @@
+import argparse
+import os
 import pygame
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
+import bitboard
 import tictactoe as ttt
 
+parser = argparse.ArgumentParser(description="Play Tic-Tac-Toe against the AI.")
+parser.add_argument("--height", type=int, default=3)
+parser.add_argument("--width", type=int, default=3)
+parser.add_argument("-k", type=int, default=3,
+                    help="number of marks in a row that wins")
+parser.add_argument("--budget", type=int, default=None, metavar="MS",
+                    help="milliseconds the AI may think per move")
+args = parser.parse_args()
+ttt.configure(args.height, args.width, args.k)
+
 pygame.init()
 size = width, height = 600, 400
 
@@ -12,19 +27,43 @@ black = (0, 0, 0)
 white = (255, 255, 255)
 
 screen = pygame.display.set_mode(size)
+clock = pygame.time.Clock()
 
 mediumFont = pygame.font.Font("OpenSans-Regular.ttf", 28)
 largeFont = pygame.font.Font("OpenSans-Regular.ttf", 40)
 moveFont = pygame.font.Font("OpenSans-Regular.ttf", 60)
 
+# Positions the AI has solved are kept between games in this file
+TRANSPOSITION_FILE = "transpositions.json"
+if os.path.exists(TRANSPOSITION_FILE):
+    ttt.load_transpositions(TRANSPOSITION_FILE)
+
+# The AI searches in a background thread, so the window keeps drawing.
+# ai_move is the future of the running search, and setting ai_cancel
+# stops it.
+executor = ThreadPoolExecutor(max_workers=1)
+ai_move = None
+ai_cancel = threading.Event()
+
+
+def cancel_ai_move():
+    global ai_move, ai_cancel
+    if ai_move is not None:
+        ai_cancel.set()
+        ai_move = None
+        ai_cancel = threading.Event()
+
+
 user = None
 board = ttt.initial_state()
-ai_turn = False
 
 while True:
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            cancel_ai_move()
+            executor.shutdown(wait=True)
+            ttt.save_transpositions(TRANSPOSITION_FILE)
             sys.exit()
 
     screen.fill(black)
@@ -67,13 +106,13 @@ while True:
     else:
 
         # Draw game board
-        tile_size = 80
-        tile_origin = (width / 2 - (1.5 * tile_size),
-                       height / 2 - (1.5 * tile_size))
+        tile_size = min(80, 240 // max(ttt.HEIGHT, ttt.WIDTH))
+        tile_origin = (width / 2 - (ttt.WIDTH / 2 * tile_size),
+                       height / 2 - (ttt.HEIGHT / 2 * tile_size))
         tiles = []
-        for i in range(3):
+        for i in range(ttt.HEIGHT):
             row = []
-            for j in range(3):
+            for j in range(ttt.WIDTH):
                 rect = pygame.Rect(
                     tile_origin[0] + j * tile_size,
                     tile_origin[1] + i * tile_size,
@@ -83,6 +122,10 @@ while True:
 
                 if board[i][j] != ttt.EMPTY:
                     move = moveFont.render(board[i][j], True, white)
+                    if tile_size < 80:
+                        move = pygame.transform.smoothscale(
+                            move, (move.get_width() * tile_size // 80,
+                                   move.get_height() * tile_size // 80))
                     moveRect = move.get_rect()
                     moveRect.center = rect.center
                     screen.blit(move, moveRect)
@@ -102,7 +145,8 @@ while True:
         elif user == player:
             title = f"Play as {user}"
         else:
-            title = f"Computer thinking..."
+            dots = pygame.time.get_ticks() // 300 % 4
+            title = "Computer thinking" + "." * dots + " " * (3 - dots)
         title = largeFont.render(title, True, white)
         titleRect = title.get_rect()
         titleRect.center = ((width / 2), 30)
@@ -110,37 +154,43 @@ while True:
 
         # Check for AI move
         if user != player and not game_over:
-            if ai_turn:
-                time.sleep(0.5)
-                move = ttt.minimax(board)
-                board = ttt.result(board, move)
-                ai_turn = False
-            else:
-                ai_turn = True
+            if ai_move is None:
+                ai_move = executor.submit(ttt.minimax, board,
+                                          budget_ms=args.budget,
+                                          cancel=ai_cancel)
+            elif ai_move.done():
+                try:
+                    board = ttt.result(board, ai_move.result())
+                except bitboard.SearchCancelled:
+                    pass
+                ai_move = None
 
         # Check for a user move
         click, _, _ = pygame.mouse.get_pressed()
         if click == 1 and user == player and not game_over:
             mouse = pygame.mouse.get_pos()
-            for i in range(3):
-                for j in range(3):
+            for i in range(ttt.HEIGHT):
+                for j in range(ttt.WIDTH):
                     if (board[i][j] == ttt.EMPTY and tiles[i][j].collidepoint(mouse)):
                         board = ttt.result(board, (i, j))
 
-        if game_over:
-            againButton = pygame.Rect(width / 3, height - 65, width / 3, 50)
-            again = mediumFont.render("Play Again", True, black)
-            againRect = again.get_rect()
-            againRect.center = againButton.center
-            pygame.draw.rect(screen, white, againButton)
-            screen.blit(again, againRect)
-            click, _, _ = pygame.mouse.get_pressed()
-            if click == 1:
-                mouse = pygame.mouse.get_pos()
-                if againButton.collidepoint(mouse):
-                    time.sleep(0.2)
-                    user = None
-                    board = ttt.initial_state()
-                    ai_turn = False
+        # Play again when the game is over, or reset it at any time, which
+        # also stops the AI if it is still thinking
+        againButton = pygame.Rect(width / 3, height - 65, width / 3, 50)
+        label = "Play Again" if game_over else "Reset"
+        again = mediumFont.render(label, True, black)
+        againRect = again.get_rect()
+        againRect.center = againButton.center
+        pygame.draw.rect(screen, white, againButton)
+        screen.blit(again, againRect)
+        click, _, _ = pygame.mouse.get_pressed()
+        if click == 1:
+            mouse = pygame.mouse.get_pos()
+            if againButton.collidepoint(mouse):
+                time.sleep(0.2)
+                cancel_ai_move()
+                user = None
+                board = ttt.initial_state()
 
     pygame.display.flip()
+    clock.tick(60)
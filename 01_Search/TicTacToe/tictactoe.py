@@ -3,21 +3,86 @@ Tic Tac Toe Player
 """
 
 import math
-import copy
+import json
+import os
+
+import bitboard
+import book
 
 X = "X"
 O = "O"
 EMPTY = None
-maxDepth = 5
+
+# Board size and the number of marks in a row that wins; see configure
+HEIGHT = 3
+WIDTH = 3
+K = 3
+
+# Boards with at most this many cells are searched to the end; on larger
+# boards minimax searches for TIME_BUDGET_MS milliseconds by default
+EXACT_CELLS = 9
+TIME_BUDGET_MS = 1000
+
+# The bitboard engine for the configured board
+game = bitboard.Game(HEIGHT, WIDTH, K)
+
+# The rotations and reflections of the board, each as the list of (i, j)
+# cells that end up at positions 0, 1, ... in row-major order
+SYMMETRIES = bitboard.symmetries(HEIGHT, WIDTH)
+
+# Kinds of values in the transposition table: the exact minimax value,
+# or a lower or upper bound left by an alpha-beta cutoff
+EXACT = "exact"
+LOWER = "lower"
+UPPER = "upper"
+
+# Maps canonical board codes to (value, best action in canonical cells,
+# bound). It persists across minimax calls and games.
+transpositions = {}
+
+# Entries of the bitboard engine's table written by save_transpositions
+MAX_SAVED_TRANSPOSITIONS = 100000
+
+# Static move ordering: cells on more winning lines first, which on 3x3
+# is the centre, then corners, then edges
+MOVE_ORDER = {game.cell(bit): -len(game.linesThrough[bit])
+              for bit in range(game.cells)}
+
+# Killer move per search depth, and history score per action
+killers = {}
+history = {}
+
+# The solved-game table of 3x3 boards, read on first use; False if the
+# table file is missing or unreadable
+openingBook = None
+
+# Nodes visited and transposition table hits of the last minimax call
+searchStats = {"nodes": 0, "hits": 0}
+
+
+def configure(height=3, width=3, k=3):
+    """
+    Switches to a height x width board on which k marks in a row win,
+    and forgets everything the searches learned about the old board.
+    """
+    global HEIGHT, WIDTH, K, game, SYMMETRIES, MOVE_ORDER
+    if not 1 <= k <= max(height, width):
+        raise ValueError("k does not fit on the board")
+    HEIGHT, WIDTH, K = height, width, k
+    game = bitboard.Game(height, width, k)
+    SYMMETRIES = bitboard.symmetries(height, width)
+    MOVE_ORDER = {game.cell(bit): -len(game.linesThrough[bit])
+                  for bit in range(game.cells)}
+    transpositions.clear()
+    killers.clear()
+    history.clear()
 
 
 def initial_state():
     """
     Returns starting state of the board.
     """
-    return [[EMPTY, EMPTY, EMPTY],
-            [EMPTY, EMPTY, EMPTY],
-            [EMPTY, EMPTY, EMPTY]]
+    return [[EMPTY] * WIDTH for _ in range(HEIGHT)]
 
 
 def player(board):
@@ -26,8 +91,8 @@ def player(board):
     """
     xCount = 0
     oCount=0
-    for i in range(3):
-        for a in range(3):
+    for i in range(len(board)):
+        for a in range(len(board[i])):
             if board[i][a] == X:
                 xCount+=1
             elif board[i][a] == O:
@@ -42,8 +107,8 @@ def actions(board):
     Returns set of all possible actions (i, j) available on the board.
     """
     possibleMoves = set()
-    for i in range(3):
-        for a in range(3):
+    for i in range(len(board)):
+        for a in range(len(board[i])):
             if board[i][a] is EMPTY:
                 possibleMoves.add((i,a))
     return possibleMoves
@@ -52,7 +117,7 @@ def result(board, action):
     """
     Returns the board that results from making move (i, j) on the board.
     """
-    newBoard = copy.deepcopy(board)
+    newBoard = [row[:] for row in board]
     if board[action[0]][action[1]] is not EMPTY:
         raise Exception()
     newBoard[action[0]][action[1]] = player(board)   
@@ -64,38 +129,28 @@ def winner(board):
     """
     
     """
-    Check horizontal
+    Check every run of K cells horizontally, vertically and diagonally
     """
-    for i in range(3):
-        player = board[i][0]
-        gotThreeInARow=True
-        for a in range(3):
-            if board[i][a] != player:
-                gotThreeInARow=False
-                break
-        if gotThreeInARow:
-            return player
+    height = len(board)
+    width = len(board[0])
+    for i in range(height):
+        for j in range(width):
+            player = board[i][j]
+            if player is EMPTY:
+                continue
+            for di, dj in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                endI = i + di * (K - 1)
+                endJ = j + dj * (K - 1)
+                if not (0 <= endI < height and 0 <= endJ < width):
+                    continue
+                gotKInARow = True
+                for step in range(1, K):
+                    if board[i + di * step][j + dj * step] != player:
+                        gotKInARow = False
+                        break
+                if gotKInARow:
+                    return player
 
-    """
-    Check vertikal
-    """
-    for i in range(3):
-        player = board[0][i]
-        gotThreeInARow=True
-        for a in range(3):
-            if board[a][i] != player:
-                gotThreeInARow=False
-                break
-        if gotThreeInARow:
-            return player       
-    """
-    Check diagonal
-    """
-    if board[0][0] == board[1][1] == board[2][2]:
-        return board[0][0]
-    if board[0][2] == board[1][1] == board[2][0]:
-        return board[0][2]
-   
     return None
 
 def terminal(board):
@@ -105,8 +160,8 @@ def terminal(board):
     if winner(board) is not None:
         return True
     
-    for i in range(3):
-        for a in range(3):
+    for i in range(len(board)):
+        for a in range(len(board[i])):
             if board[i][a] is EMPTY:
                 return False
     return True
@@ -124,46 +179,241 @@ def utility(board):
         return 0
 
 
-def minimax(board):
+def minimax(board, engine="bitboard", budget_ms=None, use_book=True,
+            cancel=None):
     """
     Returns the optimal action for the current player on the board.
+
+    On the classic 3x3 board the action is looked up in the solved-game
+    table of book.py if there is one, unless `use_book` is False.
+    Otherwise `engine` selects the search: "bitboard" converts the board
+    into the bit masks of bitboard.py, "list" searches the list-of-lists
+    board.
+
+    With `budget_ms`, the bitboard engine deepens its search until the
+    budget runs out and returns the best action found so far; boards with
+    more than EXACT_CELLS cells get TIME_BUDGET_MS by default. The list
+    engine always searches to the end of the game.
+
+    Setting the threading.Event `cancel` stops a bitboard search, which
+    then raises bitboard.SearchCancelled.
     """
-    
+    if use_book and (HEIGHT, WIDTH, K) == (3, 3, 3):
+        action = bookMove(board)
+        if action is not None:
+            return action
+
+    if engine == "bitboard":
+        if budget_ms is None and HEIGHT * WIDTH > EXACT_CELLS:
+            budget_ms = TIME_BUDGET_MS
+        bit = game.minimax(*game.from_board(board), budget_ms, cancel)
+        return None if bit is None else game.cell(bit)
+    elif engine != "list":
+        raise ValueError(f"unknown engine {engine!r}")
+
+    searchStats["nodes"] = 0
+    searchStats["hits"] = 0
     if player(board) == X:
-        return maxValue(board, 0)[1]
+        return maxValue(board, -math.inf, math.inf, 0)[1]
     else:
-        return minValue(board, 0)[1]
+        return minValue(board, -math.inf, math.inf, 0)[1]
+
+
+def bookMove(board):
+    """
+    Returns an optimal action for a 3x3 board from the solved-game table,
+    or None if there is no table or no entry for the board.
+    """
+    global openingBook
+    if openingBook is None:
+        try:
+            openingBook = book.Book.load()
+        except (OSError, ValueError):
+            openingBook = False
+    if not openingBook:
+        return None
+    return openingBook.best_move(board)
 
 
-def minValue(board, depth):
+def minValue(board, alpha, beta, depth):
+        searchStats["nodes"] += 1
         if terminal(board):
             return (utility(board), None)
-        global maxDepth
-        depth +=1 
+        cached, bestAction = lookup(board, alpha, beta)
+        if cached is not None:
+            return cached
+        originalBeta = beta
         v = math.inf
-        bestAction = None
-        for action in actions(board):
-            newMin = min(v, float(maxValue(result(board,action), depth)[0]))
+        for action in orderedActions(board, depth, bestAction):
+            newMin = maxValue(result(board, action), alpha, beta, depth + 1)[0]
             if v > newMin:
                 v = newMin
                 bestAction = action
-            if depth > maxDepth:
-                return (v, action)
-            
-        return (v,bestAction)
+            beta = min(beta, v)
+            if alpha >= beta:
+                recordCutoff(action, depth)
+                break
+        store(board, v, bestAction, alpha, originalBeta)
+        return (v, bestAction)
 
-def maxValue(board, depth):
+def maxValue(board, alpha, beta, depth):
+        searchStats["nodes"] += 1
         if terminal(board):
             return (utility(board), None)
-        global maxDepth
-        depth +=1  
+        cached, bestAction = lookup(board, alpha, beta)
+        if cached is not None:
+            return cached
+        originalAlpha = alpha
         v = -math.inf
-        bestAction = None
-        for action in actions(board):
-            newMax = max(v, float(minValue(result(board,action), depth)[0]))
+        for action in orderedActions(board, depth, bestAction):
+            newMax = minValue(result(board, action), alpha, beta, depth + 1)[0]
             if v < newMax:
                 v = newMax
                 bestAction = action
-            if depth > maxDepth:
-                return (v, bestAction)  
-        return (v,bestAction)
\ No newline at end of file
+            alpha = max(alpha, v)
+            if alpha >= beta:
+                recordCutoff(action, depth)
+                break
+        store(board, v, bestAction, originalAlpha, beta)
+        return (v, bestAction)
+
+
+def orderedActions(board, depth, firstAction=None):
+    """
+    Returns the actions on the board, most promising first: the best
+    action known from the transposition table, the killer move of this
+    depth, then by history score, and finally by MOVE_ORDER.
+    """
+    killer = killers.get(depth)
+
+    def priority(action):
+        return (action != firstAction,
+                action != killer,
+                -history.get(action, 0),
+                MOVE_ORDER[action])
+
+    return sorted(actions(board), key=priority)
+
+
+def recordCutoff(action, depth):
+    """
+    Remembers an action that caused a cutoff, as the killer move of its
+    depth and in the history scores, weighting cutoffs near the root more.
+    """
+    killers[depth] = action
+    history[action] = (history.get(action, 0)
+                       + 2 ** max(0, HEIGHT * WIDTH - depth))
+
+
+def canonical(board):
+    """
+    Returns (code, symmetry) for the board: the smallest base-3 code of
+    all its rotations and reflections, and the index of the symmetry in
+    SYMMETRIES that produces it.
+    """
+    values = {EMPTY: 0, X: 1, O: 2}
+    best = None
+    for index, cells in enumerate(SYMMETRIES):
+        code = 0
+        for i, j in cells:
+            code = code * 3 + values[board[i][j]]
+        if best is None or code < best[0]:
+            best = (code, index)
+    return best
+
+
+def lookup(board, alpha, beta):
+    """
+    Looks the board up in the transposition table. Returns (result, action):
+    the cached (value, action) result if it settles the search within the
+    (alpha, beta) window, else None, and the best action known for the
+    board, or None.
+    """
+    code, symmetry = canonical(board)
+    entry = transpositions.get(code)
+    if entry is None:
+        return None, None
+    value, position, bound = entry
+    # Map the canonical cell back to the cell on this board
+    action = SYMMETRIES[symmetry][position]
+    if (bound == EXACT
+            or (bound == LOWER and value >= beta)
+            or (bound == UPPER and value <= alpha)):
+        searchStats["hits"] += 1
+        return (value, action), action
+    return None, action
+
+
+def store(board, value, action, alpha, beta):
+    """
+    Caches the value and best action found for the board when searching
+    the (alpha, beta) window, recording whether the value is exact or
+    only a bound.
+    """
+    if value <= alpha:
+        bound = UPPER
+    elif value >= beta:
+        bound = LOWER
+    else:
+        bound = EXACT
+    code, symmetry = canonical(board)
+    transpositions[code] = (value, SYMMETRIES[symmetry].index(action), bound)
+
+
+def save_transpositions(path):
+    """
+    Writes the transposition tables of both engines for the configured
+    board to a JSON file, keeping the tables saved there for other boards.
+    The bitboard table keeps its MAX_SAVED_TRANSPOSITIONS deepest entries.
+    """
+    try:
+        boards = readTranspositions(path)
+    except (OSError, ValueError):
+        boards = {}
+    deepest = sorted(game.transpositions.items(),
+                     key=lambda item: -item[1][2])[:MAX_SAVED_TRANSPOSITIONS]
+    boards[boardKey()] = {
+        "list": {str(code): entry for code, entry in transpositions.items()},
+        "bitboard": {str(key): entry for key, entry in deepest}
+    }
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump({"boards": boards}, f)
+    os.replace(temporary, path)
+
+
+def load_transpositions(path):
+    """
+    Adds the entries a file written by save_transpositions holds for the
+    configured board to the transposition tables of both engines, skipping
+    entries it does not understand.
+    """
+    saved = readTranspositions(path).get(boardKey(), {})
+    for code, entry in saved.get("list", {}).items():
+        if len(entry) == 3 and entry[2] in (EXACT, LOWER, UPPER):
+            transpositions[int(code)] = tuple(entry)
+    for key, entry in saved.get("bitboard", {}).items():
+        if len(entry) == 4 and entry[1] in (EXACT, LOWER, UPPER):
+            game.transpositions[int(key)] = tuple(entry)
+
+
+def readTranspositions(path):
+    """
+    Returns the tables of a transposition file by board key. Older files
+    held the list engine's table of a single board.
+    """
+    with open(path) as f:
+        saved = json.load(f)
+    if not isinstance(saved, dict):
+        raise ValueError(f"{path} is not a transposition file")
+    if "boards" in saved:
+        return saved["boards"]
+    if "entries" not in saved:
+        # Files from before board sizes were configurable are all 3x3
+        saved = {"board": [3, 3, 3], "entries": saved}
+    height, width, k = saved["board"]
+    return {f"{height}x{width}x{k}": {"list": saved["entries"]}}
+
+
+def boardKey():
+    return f"{HEIGHT}x{WIDTH}x{K}"
@@ -1,4 +1,8 @@
+import functools
 import itertools
+import multiprocessing
+import os
+import weakref
 
 
 class Sentence():
@@ -15,6 +19,41 @@ class Sentence():
         """Returns a set of all symbols in the logical sentence."""
         return set()
 
+    def code(self, indices):
+        """
+        Returns a Python expression that evaluates the sentence for the
+        truth assignment `m`, an integer whose bit indices[name] is the
+        value of symbol `name`.
+        """
+        raise Exception("nothing to compile")
+
+    def bitwise_code(self, indices):
+        """
+        Returns a Python expression that evaluates the sentence for many
+        truth assignments at once. `c[indices[name]]` holds the values of
+        symbol `name` in all assignments as the bits of an integer, or as
+        a NumPy boolean array; `full` is the value with every assignment
+        true (all ones, or True).
+        """
+        raise Exception("nothing to compile")
+
+    def compile(self, symbols):
+        """
+        Returns a function of an integer truth assignment that evaluates
+        the sentence, where bit i is the value of the i-th of `symbols`.
+        """
+        indices = {symbol: i for i, symbol in enumerate(symbols)}
+        return compiled(f"lambda m: bool({self.code(indices)})")
+
+    def compile_bitwise(self, symbols):
+        """
+        Returns a function of (c, full) that evaluates the sentence for
+        many assignments at once, where c[i] holds the values of the i-th
+        of `symbols`; see bitwise_code.
+        """
+        indices = {symbol: i for i, symbol in enumerate(symbols)}
+        return compiled(f"lambda c, full: {self.bitwise_code(indices)}")
+
     @classmethod
     def validate(cls, sentence):
         if not isinstance(sentence, Sentence):
@@ -42,6 +81,12 @@ class Sentence():
             return f"({s})"
 
 
+@functools.lru_cache(maxsize=1024)
+def compiled(source):
+    """Compiles generated source, reusing it for equal sentences."""
+    return eval(source)
+
+
 class Symbol(Sentence):
 
     def __init__(self, name):
@@ -68,6 +113,12 @@ class Symbol(Sentence):
     def symbols(self):
         return {self.name}
 
+    def code(self, indices):
+        return f"(m >> {indices[self.name]} & 1)"
+
+    def bitwise_code(self, indices):
+        return f"c[{indices[self.name]}]"
+
 
 class Not(Sentence):
     def __init__(self, operand):
@@ -92,6 +143,12 @@ class Not(Sentence):
     def symbols(self):
         return self.operand.symbols()
 
+    def code(self, indices):
+        return f"(not {self.operand.code(indices)})"
+
+    def bitwise_code(self, indices):
+        return f"(full ^ {self.operand.bitwise_code(indices)})"
+
 
 class And(Sentence):
     def __init__(self, *conjuncts):
@@ -127,7 +184,21 @@ class And(Sentence):
                            for conjunct in self.conjuncts])
 
     def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+        return set().union(*[conjunct.symbols()
+                             for conjunct in self.conjuncts])
+
+    def code(self, indices):
+        if not self.conjuncts:
+            return "True"
+        return "(" + " and ".join(
+            conjunct.code(indices) for conjunct in self.conjuncts) + ")"
+
+    def bitwise_code(self, indices):
+        if not self.conjuncts:
+            return "full"
+        return "(" + " & ".join(
+            conjunct.bitwise_code(indices)
+            for conjunct in self.conjuncts) + ")"
 
 
 class Or(Sentence):
@@ -158,7 +229,21 @@ class Or(Sentence):
                             for disjunct in self.disjuncts])
 
     def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+        return set().union(*[disjunct.symbols()
+                             for disjunct in self.disjuncts])
+
+    def code(self, indices):
+        if not self.disjuncts:
+            return "False"
+        return "(" + " or ".join(
+            disjunct.code(indices) for disjunct in self.disjuncts) + ")"
+
+    def bitwise_code(self, indices):
+        if not self.disjuncts:
+            return "(full ^ full)"
+        return "(" + " | ".join(
+            disjunct.bitwise_code(indices)
+            for disjunct in self.disjuncts) + ")"
 
 
 class Implication(Sentence):
@@ -191,6 +276,14 @@ class Implication(Sentence):
     def symbols(self):
         return set.union(self.antecedent.symbols(), self.consequent.symbols())
 
+    def code(self, indices):
+        return (f"(not {self.antecedent.code(indices)}"
+                f" or {self.consequent.code(indices)})")
+
+    def bitwise_code(self, indices):
+        return (f"((full ^ {self.antecedent.bitwise_code(indices)})"
+                f" | {self.consequent.bitwise_code(indices)})")
+
 
 class Biconditional(Sentence):
     def __init__(self, left, right):
@@ -211,10 +304,7 @@ class Biconditional(Sentence):
         return f"Biconditional({self.left}, {self.right})"
 
     def evaluate(self, model):
-        return ((self.left.evaluate(model)
-                 and self.right.evaluate(model))
-                or (not self.left.evaluate(model)
-                    and not self.right.evaluate(model)))
+        return self.left.evaluate(model) == self.right.evaluate(model)
 
     def formula(self):
         left = Sentence.parenthesize(str(self.left))
@@ -224,9 +314,259 @@ class Biconditional(Sentence):
     def symbols(self):
         return set.union(self.left.symbols(), self.right.symbols())
 
+    def code(self, indices):
+        return (f"(bool({self.left.code(indices)})"
+                f" == bool({self.right.code(indices)}))")
+
+    def bitwise_code(self, indices):
+        return (f"(full ^ {self.left.bitwise_code(indices)}"
+                f" ^ {self.right.bitwise_code(indices)})")
+
 
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
+class Interned():
+    """
+    Mixin of the shared, unchangeable sentences made by interned.
+
+    There is only one interned sentence of each structure, so interned
+    sentences are equal exactly when they are the same object. Their hash
+    is computed once, and their symbols and formula the first time they
+    are asked for.
+    """
+
+    def __eq__(self, other):
+        if isinstance(other, Interned):
+            return self is other
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return self.cachedHash
+
+    def symbols(self):
+        if self.cachedSymbols is None:
+            self.cachedSymbols = frozenset(super().symbols())
+        return set(self.cachedSymbols)
+
+    def formula(self):
+        if self.cachedFormula is None:
+            self.cachedFormula = super().formula()
+        return self.cachedFormula
+
+    def add(self, conjunct):
+        raise TypeError("interned sentences cannot be changed")
+
+    def __reduce__(self):
+        # The generated classes cannot be pickled by name, so pickle a
+        # plain copy and intern it again when unpickling
+        plain = object.__new__(type(self).__mro__[2])
+        plain.__dict__.update(
+            (name, value) for name, value in self.__dict__.items()
+            if not name.startswith("cached"))
+        return interned, (plain,)
+
+
+# Interned subclass of every sentence class
+INTERNED_CLASSES = {
+    cls: type(f"Interned{cls.__name__}", (Interned, cls), {})
+    for cls in (Symbol, Not, And, Or, Implication, Biconditional)
+}
+
+# The interned sentence of every structure in use, keyed by its class and
+# name or the identities of its interned parts
+internedSentences = weakref.WeakValueDictionary()
+
+
+def interned(sentence):
+    """
+    Returns the interned sentence structurally equal to `sentence`, which
+    is shared with every other sentence of the same structure.
+    """
+    if isinstance(sentence, Interned):
+        return sentence
+    Sentence.validate(sentence)
+    cls = type(sentence)
+    if cls not in INTERNED_CLASSES:
+        raise TypeError(f"cannot intern {cls.__name__}")
+
+    if cls is Symbol:
+        parts = [sentence.name]
+        key = (cls, sentence.name)
+    else:
+        if cls is Not:
+            parts = [sentence.operand]
+        elif cls is And:
+            parts = sentence.conjuncts
+        elif cls is Or:
+            parts = sentence.disjuncts
+        elif cls is Implication:
+            parts = [sentence.antecedent, sentence.consequent]
+        else:
+            parts = [sentence.left, sentence.right]
+        parts = [interned(part) for part in parts]
+        key = (cls, tuple(id(part) for part in parts))
+
+    node = internedSentences.get(key)
+    if node is None:
+        node = INTERNED_CLASSES[cls].__new__(INTERNED_CLASSES[cls])
+        cls.__init__(node, *parts)
+        node.cachedHash = cls.__hash__(node)
+        node.cachedSymbols = None
+        node.cachedFormula = None
+        internedSentences[key] = node
+    return node
+
+
+# model_check evaluates the assignments of this many symbols at once, as
+# the bits of one integer per symbol
+CHUNK_SYMBOLS = 16
+
+
+def model_check(knowledge, query, method="enumerate"):
+    """
+    Checks if knowledge base entails query.
+
+    `method` "enumerate" checks every model of the symbols, evaluating
+    the compiled sentences on 2 ** CHUNK_SYMBOLS models at a time;
+    "recursive" checks them one by one by walking the sentences; "cdcl"
+    asks the SAT solver in solver.py whether knowledge ∧ ¬query is
+    unsatisfiable, which stays fast with many more symbols.
+    """
+    if method == "cdcl":
+        # solver.py builds on the sentence classes of this module
+        from solver import entails
+        return entails(knowledge, query)
+    elif method == "recursive":
+        return model_check_recursive(knowledge, query)
+    elif method != "enumerate":
+        raise ValueError(f"unknown method {method!r}")
+
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    try:
+        knowledgeTable = knowledge.compile_bitwise(symbols)
+        queryTable = query.compile_bitwise(symbols)
+    except (SyntaxError, RecursionError, MemoryError):
+        # Sentences nested too deeply for the Python compiler
+        return model_check_recursive(knowledge, query)
+
+    for c, full in truth_table_chunks(len(symbols)):
+        if knowledgeTable(c, full) & ~queryTable(c, full) & full:
+            return False
+    return True
+
+
+def truth_table_chunks(count):
+    """
+    Yields (columns, full) for the models of `count` symbols, up to
+    2 ** CHUNK_SYMBOLS models at a time. The first symbols vary within a
+    chunk, as in truth_table_columns, and the rest are fixed per chunk and
+    taken from the chunk number.
+    """
+    inner = min(count, CHUNK_SYMBOLS)
+    full = (1 << (1 << inner)) - 1
+    columns = truth_table_columns(inner)
+    for chunk in range(1 << (count - inner)):
+        yield columns + [full if chunk >> i & 1 else 0
+                         for i in range(count - inner)], full
+
+
+# model_check_batch only starts worker processes when its sentences have
+# to be evaluated in at least this many models in total, about a tenth of
+# a second of work on one process
+MIN_PARALLEL_MODELS = 1 << 30
+
+
+def model_check_batch(jobs, processes=None):
+    """
+    Checks many entailments at once. `jobs` is a list of
+    (knowledge, queries) pairs; returns, for every job, the list telling
+    whether knowledge entails each of its queries.
+
+    Jobs over the same symbols share one truth table of all their models,
+    on which every knowledge base and query is evaluated column-wise.
+    Groups of jobs are spread over `processes` worker processes (default:
+    one per CPU) when there is enough work to make up for starting them;
+    processes=1 checks everything in this process.
+    """
+    jobs = [(knowledge, list(queries)) for knowledge, queries in jobs]
+    groups = {}
+    for index, (knowledge, queries) in enumerate(jobs):
+        symbols = set(knowledge.symbols())
+        for query in queries:
+            symbols |= query.symbols()
+        groups.setdefault(frozenset(symbols), []).append(index)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    # Split large groups so that every process gets a share of the work
+    tasks = []
+    for symbols, indices in groups.items():
+        size = max(1, -(-len(indices) // processes))
+        for start in range(0, len(indices), size):
+            part = indices[start:start + size]
+            tasks.append((part, sorted(symbols), [jobs[i] for i in part]))
+
+    # Every sentence of a task is evaluated in every model of its symbols
+    work = sum((1 + len(queries)) << len(symbols)
+               for _, symbols, taskJobs in tasks
+               for _, queries in taskJobs)
+    if processes > 1 and len(tasks) > 1 and work >= MIN_PARALLEL_MODELS:
+        with multiprocessing.Pool(processes) as pool:
+            answers = pool.starmap(check_group,
+                                   [task[1:] for task in tasks])
+    else:
+        answers = [check_group(*task[1:]) for task in tasks]
+
+    results = [None] * len(jobs)
+    for (indices, _, _), groupAnswers in zip(tasks, answers):
+        for index, jobAnswers in zip(indices, groupAnswers):
+            results[index] = jobAnswers
+    return results
+
+
+def check_group(symbols, jobs):
+    """
+    Checks the (knowledge, queries) jobs whose sentences all use only
+    `symbols`, sharing the truth table of those symbols.
+    """
+    try:
+        tables = [(knowledge.compile_bitwise(symbols),
+                   [query.compile_bitwise(symbols) for query in queries])
+                  for knowledge, queries in jobs]
+    except (SyntaxError, RecursionError, MemoryError):
+        return [[model_check_recursive(knowledge, query)
+                 for query in queries] for knowledge, queries in jobs]
+
+    answers = [[True] * len(queries) for _, queries in jobs]
+    for c, full in truth_table_chunks(len(symbols)):
+        for (knowledgeTable, queryTables), jobAnswers in zip(tables,
+                                                             answers):
+            models = knowledgeTable(c, full) & full
+            if not models:
+                continue
+            for i, queryTable in enumerate(queryTables):
+                if jobAnswers[i] and models & ~queryTable(c, full):
+                    jobAnswers[i] = False
+    return answers
+
+
+def truth_table_columns(count):
+    """
+    Returns the columns of the truth table of `count` symbols as integers:
+    bit m of column i is the value of symbol i in model m, which is bit i
+    of m.
+    """
+    rows = 1 << count
+    everyRow = (1 << rows) - 1
+    columns = []
+    for i in range(count):
+        period = 1 << (i + 1)
+        # Ones in the upper half of every period of 2 ** (i + 1) rows
+        block = ((1 << (1 << i)) - 1) << (1 << i)
+        columns.append(block * (everyRow // ((1 << period) - 1)))
+    return columns
+
+
+def model_check_recursive(knowledge, query):
+    """Checks if knowledge base entails query, one model at a time."""
 
     def check_all(knowledge, query, symbols, model):
         """Checks if knowledge base entails query, given a particular model."""
@@ -261,3 +601,117 @@ def model_check(knowledge, query):
 
     # Check that knowledge entails query
     return check_all(knowledge, query, symbols, dict())
+
+
+# Knowledge bases with more symbols than this use the SAT solver instead
+# of a table of their models
+MAX_TABLE_SYMBOLS = 20
+
+
+class KnowledgeBase():
+    """
+    Knowledge base that answers many entailment queries.
+
+    The models that satisfy the knowledge are kept as a truth table: an
+    integer whose bit m is set if the model m, where bit i of m is the
+    value of the i-th symbol, satisfies every sentence. Adding a sentence
+    only filters that table, and a query is answered by evaluating it
+    over the table once. Past MAX_TABLE_SYMBOLS symbols the sentences go
+    to the SAT solver of solver.py instead.
+    """
+
+    def __init__(self, *sentences):
+        self.sentences = []
+        self.symbols = []
+        self.table = 1
+        self.columns = []
+        self.cnf = None
+        # Answers to queries; True answers stay true as knowledge grows
+        self.answers = {}
+        for sentence in sentences:
+            self.add(sentence)
+
+    def add(self, sentence):
+        """
+        Adds a sentence to the knowledge base.
+        """
+        Sentence.validate(sentence)
+        self.sentences.append(sentence)
+        self.answers = {query: True
+                        for query, answer in self.answers.items() if answer}
+        symbols = sentence.symbols()
+        if self.cnf is not None:
+            self.cnf.add(sentence)
+        elif not symbols:
+            # Without symbols the sentence is true or false in every model
+            if not sentence.evaluate({}):
+                self.table = 0
+        elif self.extend(symbols):
+            self.table &= sentence.compile_bitwise(self.symbols)(
+                self.columns, self.full())
+
+    def entails(self, query):
+        """
+        Checks if the knowledge base entails query.
+        """
+        if query not in self.answers:
+            if self.cnf is not None:
+                self.answers[query] = not self.cnf.solver.solve(
+                    [self.cnf.literal(query) ^ 1])
+            elif self.extend(query.symbols()):
+                queryTable = query.compile_bitwise(self.symbols)(
+                    self.columns, self.full())
+                self.answers[query] = not self.table & ~queryTable
+            else:
+                return self.entails(query)
+        return self.answers[query]
+
+    def satisfiable(self):
+        """
+        Checks if some model satisfies every sentence.
+        """
+        if self.cnf is not None:
+            return self.cnf.solver.solve()
+        return self.table != 0
+
+    def models(self):
+        """
+        Yields every model satisfying the knowledge base as a dict from
+        symbol to truth value. Only available below MAX_TABLE_SYMBOLS.
+        """
+        if self.cnf is not None:
+            raise ValueError("too many symbols to list the models")
+        table = self.table
+        while table:
+            model = (table & -table).bit_length() - 1
+            table &= table - 1
+            yield {symbol: bool(model >> i & 1)
+                   for i, symbol in enumerate(self.symbols)}
+
+    def full(self):
+        return (1 << (1 << len(self.symbols))) - 1
+
+    def extend(self, symbols):
+        """
+        Adds new symbols to the truth table, where they may be true or
+        false in every model. Returns False if that would make the table
+        too large, after moving the knowledge base to the SAT solver.
+        """
+        new = sorted(set(symbols) - set(self.symbols))
+        if not new:
+            return True
+        if len(self.symbols) + len(new) > MAX_TABLE_SYMBOLS:
+            # solver.py builds on the sentence classes of this module
+            from solver import CNF
+            self.cnf = CNF()
+            for sentence in self.sentences:
+                self.cnf.add(sentence)
+            self.table = self.columns = None
+            return False
+        for symbol in new:
+            # Models with the new symbol false keep their bit; copies with
+            # it true go above them
+            self.table |= self.table << (1 << len(self.symbols))
+            self.symbols.append(symbol)
+        self.columns = truth_table_columns(len(self.symbols))
+        return True
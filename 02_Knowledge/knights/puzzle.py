@@ -1,28 +1,28 @@
 from logic import *
 
-AKnight = Symbol("A is a Knight")
-AKnave = Symbol("A is a Knave")
+AKnight = interned(Symbol("A is a Knight"))
+AKnave = interned(Symbol("A is a Knave"))
 
-BKnight = Symbol("B is a Knight")
-BKnave = Symbol("B is a Knave")
+BKnight = interned(Symbol("B is a Knight"))
+BKnave = interned(Symbol("B is a Knave"))
 
-CKnight = Symbol("C is a Knight")
-CKnave = Symbol("C is a Knave")
+CKnight = interned(Symbol("C is a Knight"))
+CKnave = interned(Symbol("C is a Knave"))
 
 # Puzzle 0
 # A says "I am both a knight and a knave."
-knowledge0 = And(
+knowledge0 = interned(And(
     Or(AKnight, AKnave),
     Biconditional(Not(AKnight), AKnave),
 
     Implication(AKnave, Not(And(AKnight, AKnave))),
     Implication(AKnight, And(AKnight, AKnave)),
-)
+))
 
 # Puzzle 1
 # A says "We are both knaves."
 # B says nothing.
-knowledge1 = And(
+knowledge1 = interned(And(
     Or(AKnight, AKnave),
     Biconditional(Not(AKnight), AKnave),
     Or(BKnight, BKnave),
@@ -30,12 +30,12 @@ knowledge1 = And(
 
     Implication(AKnave, Not(And(AKnave, BKnave))),
     Implication(AKnight, And(AKnave, BKnave)),
-)
+))
 
 # Puzzle 2
 # A says "We are the same kind."
 # B says "We are of different kinds."
-knowledge2 = And(
+knowledge2 = interned(And(
     Or(AKnight, AKnave),
     Biconditional(Not(AKnight), AKnave),
     Or(BKnight, BKnave),
@@ -46,14 +46,14 @@ knowledge2 = And(
 
     Implication(BKnave, Not(Or(And(AKnave,BKnight),And(AKnight,BKnave)))),
     Implication(BKnight, Or(And(AKnave,BKnight),And(AKnight,BKnave)))
-)
+))
 
 # Puzzle 3
 # A says either "I am a knight." or "I am a knave.", but you don't know which.
 # B says "A said 'I am a knave'."
 # B says "C is a knave."
 # C says "A is a knight."
-knowledge3 = And(
+knowledge3 = interned(And(
     Or(AKnight, AKnave),
     Biconditional(Not(AKnight), AKnave),
     Or(BKnight, BKnave),
@@ -72,7 +72,7 @@ knowledge3 = And(
 
     Implication(CKnave, Not(AKnight)),
     Implication(CKnight, AKnight),
-)
+))
 
 
 def main():
@@ -83,13 +83,17 @@ def main():
         ("Puzzle 2", knowledge2),
         ("Puzzle 3", knowledge3)
     ]
+    implemented = [knowledge for _, knowledge in puzzles
+                   if len(knowledge.conjuncts) != 0]
+    answers = iter(model_check_batch(
+        [(knowledge, symbols) for knowledge in implemented]))
     for puzzle, knowledge in puzzles:
         print(puzzle)
         if len(knowledge.conjuncts) == 0:
             print("    Not yet implemented.")
         else:
-            for symbol in symbols:
-                if model_check(knowledge, symbol):
+            for symbol, isEntailed in zip(symbols, next(answers)):
+                if isEntailed:
                     print(f"    {symbol}")
 
 
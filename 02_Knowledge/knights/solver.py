@@ -0,0 +1,402 @@
+"""
+CNF encoding and a CDCL SAT solver for logic.py sentences
+
+A knowledge base entails a query if the knowledge base together with the
+negated query is unsatisfiable. Sentences are turned into clauses with the
+Tseitin transform, which adds one variable per compound subsentence and
+keeps the clauses linear in the size of the sentence.
+
+Variables are positive integers. Literals are integers too: 2 * v for
+v being true and 2 * v + 1 for v being false, so `literal ^ 1` negates.
+"""
+
+import heapq
+
+from logic import And, Biconditional, Implication, Not, Or, Symbol
+
+# Activity decay of the decision heuristic and the first restart interval
+DECAY = 0.95
+RESTART_CONFLICTS = 100
+RESTART_GROWTH = 1.5
+
+
+def entails(knowledge, query):
+    """
+    Checks if knowledge base entails query.
+    """
+    cnf = CNF()
+    cnf.add(knowledge)
+    return not cnf.solver.solve([cnf.literal(query) ^ 1])
+
+
+class CNF():
+    """
+    Tseitin encoding of sentences into the clauses of a Solver.
+    Every subsentence gets a literal that is true exactly when the
+    subsentence is, so literals can be assumed or negated freely.
+    """
+
+    def __init__(self):
+        self.solver = Solver()
+        self.variables = {}
+        self.literals = {}
+        self.true = None
+
+    def variable(self, name):
+        """
+        Returns the variable of the symbol called `name`.
+        """
+        if name not in self.variables:
+            self.variables[name] = self.solver.new_variable()
+        return self.variables[name]
+
+    def add(self, sentence):
+        """
+        Adds the sentence to the clauses as a fact.
+        """
+        if isinstance(sentence, And):
+            for conjunct in sentence.conjuncts:
+                self.add(conjunct)
+        elif isinstance(sentence, Or):
+            self.solver.add_clause([self.literal(disjunct)
+                                    for disjunct in sentence.disjuncts])
+        else:
+            self.solver.add_clause([self.literal(sentence)])
+
+    def literal(self, sentence):
+        """
+        Returns the literal that stands for the sentence, adding the
+        clauses defining it the first time the sentence is seen.
+        """
+        if sentence in self.literals:
+            return self.literals[sentence]
+
+        if isinstance(sentence, Symbol):
+            literal = 2 * self.variable(sentence.name)
+        elif isinstance(sentence, Not):
+            literal = self.literal(sentence.operand) ^ 1
+        elif isinstance(sentence, (And, Or)):
+            children = sentence.conjuncts if isinstance(sentence, And) \
+                else sentence.disjuncts
+            operands = [self.literal(child) for child in children]
+            if isinstance(sentence, Or):
+                # a ∨ b is ¬(¬a ∧ ¬b)
+                operands = [operand ^ 1 for operand in operands]
+            if not operands:
+                literal = self.constant()
+            elif len(operands) == 1:
+                literal = operands[0]
+            else:
+                # g <=> a ∧ b ∧ ...
+                literal = 2 * self.solver.new_variable()
+                for operand in operands:
+                    self.solver.add_clause([literal ^ 1, operand])
+                self.solver.add_clause(
+                    [literal] + [operand ^ 1 for operand in operands])
+            if isinstance(sentence, Or):
+                literal ^= 1
+        elif isinstance(sentence, Implication):
+            a = self.literal(sentence.antecedent)
+            b = self.literal(sentence.consequent)
+            # g <=> ¬a ∨ b
+            literal = 2 * self.solver.new_variable()
+            self.solver.add_clause([literal ^ 1, a ^ 1, b])
+            self.solver.add_clause([literal, a])
+            self.solver.add_clause([literal, b ^ 1])
+        elif isinstance(sentence, Biconditional):
+            a = self.literal(sentence.left)
+            b = self.literal(sentence.right)
+            # g <=> (a <=> b)
+            literal = 2 * self.solver.new_variable()
+            self.solver.add_clause([literal ^ 1, a ^ 1, b])
+            self.solver.add_clause([literal ^ 1, a, b ^ 1])
+            self.solver.add_clause([literal, a, b])
+            self.solver.add_clause([literal, a ^ 1, b ^ 1])
+        else:
+            raise TypeError(f"cannot encode {sentence!r}")
+
+        self.literals[sentence] = literal
+        return literal
+
+    def constant(self):
+        """
+        Returns a literal that is always true.
+        """
+        if self.true is None:
+            self.true = 2 * self.solver.new_variable()
+            self.solver.add_clause([self.true])
+        return self.true
+
+    def model(self):
+        """
+        Returns the truth value of every symbol in the last satisfying
+        assignment the solver found.
+        """
+        return {name: self.solver.values[2 * variable] is True
+                for name, variable in self.variables.items()}
+
+
+class Solver():
+    """
+    Conflict-driven clause learning SAT solver.
+
+    Unit propagation watches two literals per clause. A conflict is
+    analysed back to its first unique implication point, the learned
+    clause is kept and the search jumps back to the level where that
+    clause becomes unit. Decisions pick the unassigned variable most
+    involved in recent conflicts.
+    """
+
+    def __init__(self):
+        self.count = 0
+        # Truth value of every literal, None while unassigned
+        self.values = [None, None]
+        self.levels = [0]
+        self.reasons = [None]
+        self.activity = [0.0]
+        self.phases = [False]
+        self.watches = [[], []]
+        self.order = []
+
+        self.clauses = []
+        self.learned = []
+        self.trail = []
+        self.trailLimits = []
+        self.head = 0
+        self.increment = 1.0
+        self.ok = True
+
+    def new_variable(self):
+        self.count += 1
+        self.values += [None, None]
+        self.levels.append(0)
+        self.reasons.append(None)
+        self.activity.append(0.0)
+        self.phases.append(False)
+        self.watches += [[], []]
+        heapq.heappush(self.order, (0.0, self.count))
+        return self.count
+
+    def add_clause(self, literals):
+        """
+        Adds a clause, given as a list of literals. Returns False if the
+        clauses have become unsatisfiable.
+        """
+        if not self.ok:
+            return False
+        if self.trailLimits:
+            self.backtrack(0)
+
+        literals = set(literals)
+        clause = []
+        for literal in literals:
+            if literal ^ 1 in literals or self.values[literal] is True:
+                return True
+            if self.values[literal] is None:
+                clause.append(literal)
+
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self.assign(clause[0], None)
+            self.ok = self.propagate() is None
+        else:
+            self.clauses.append(clause)
+            self.watch(clause)
+        return self.ok
+
+    def watch(self, clause):
+        self.watches[clause[0]].append(clause)
+        self.watches[clause[1]].append(clause)
+
+    def assign(self, literal, reason):
+        variable = literal >> 1
+        self.values[literal] = True
+        self.values[literal ^ 1] = False
+        self.levels[variable] = len(self.trailLimits)
+        self.reasons[variable] = reason
+        self.trail.append(literal)
+
+    def propagate(self):
+        """
+        Assigns all literals implied by unit clauses. Returns a clause
+        whose literals are all false, or None if there is no conflict.
+        """
+        values = self.values
+        watches = self.watches
+        while self.head < len(self.trail):
+            false = self.trail[self.head] ^ 1
+            self.head += 1
+            watching = watches[false]
+            watches[false] = kept = []
+            for index, clause in enumerate(watching):
+                # Keep the false literal second
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], false
+                if values[clause[0]] is True:
+                    kept.append(clause)
+                    continue
+
+                # Look for another literal that is not false to watch
+                for k in range(2, len(clause)):
+                    if values[clause[k]] is not False:
+                        clause[1], clause[k] = clause[k], false
+                        watches[clause[1]].append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if values[clause[0]] is False:
+                        kept.extend(watching[index + 1:])
+                        return clause
+                    self.assign(clause[0], clause)
+        return None
+
+    def analyze(self, conflict):
+        """
+        Returns (clause, level): the clause learned from a conflict, with
+        the literal it asserts first, and the level to backtrack to.
+        """
+        level = len(self.trailLimits)
+        learned = [None]
+        seen = set()
+        pending = 0
+        literal = None
+        index = len(self.trail) - 1
+        clause = conflict
+        while True:
+            for other in clause:
+                variable = other >> 1
+                if other == literal or variable in seen:
+                    continue
+                if self.levels[variable] > 0:
+                    seen.add(variable)
+                    self.bump(variable)
+                    if self.levels[variable] == level:
+                        pending += 1
+                    else:
+                        learned.append(other)
+
+            # Resolve with the reason of the latest marked literal
+            while self.trail[index] >> 1 not in seen:
+                index -= 1
+            literal = self.trail[index]
+            index -= 1
+            clause = self.reasons[literal >> 1]
+            pending -= 1
+            if pending == 0:
+                break
+
+        learned[0] = literal ^ 1
+        backtrackLevel = 0
+        if len(learned) > 1:
+            # Watch the literal of the highest remaining level second
+            highest = max(range(1, len(learned)),
+                          key=lambda i: self.levels[learned[i] >> 1])
+            learned[1], learned[highest] = learned[highest], learned[1]
+            backtrackLevel = self.levels[learned[1] >> 1]
+        self.increment /= DECAY
+        return learned, backtrackLevel
+
+    def bump(self, variable):
+        self.activity[variable] += self.increment
+        if self.activity[variable] > 1e100:
+            self.activity = [activity * 1e-100
+                             for activity in self.activity]
+            self.increment *= 1e-100
+            self.order = [(-self.activity[variable], variable)
+                          for variable in range(1, self.count + 1)]
+            heapq.heapify(self.order)
+        else:
+            heapq.heappush(self.order,
+                           (-self.activity[variable], variable))
+
+    def backtrack(self, level):
+        """
+        Undoes all assignments made above decision level `level`.
+        """
+        if len(self.trailLimits) <= level:
+            return
+        start = self.trailLimits[level]
+        for literal in self.trail[start:]:
+            variable = literal >> 1
+            self.phases[variable] = not literal & 1
+            self.values[literal] = self.values[literal ^ 1] = None
+            self.reasons[variable] = None
+            heapq.heappush(self.order,
+                           (-self.activity[variable], variable))
+        del self.trail[start:]
+        del self.trailLimits[level:]
+        self.head = len(self.trail)
+        if len(self.order) > 4 * self.count + 100:
+            # Drop the outdated entries the heap collected
+            self.order = [(-self.activity[variable], variable)
+                          for variable in range(1, self.count + 1)
+                          if self.values[2 * variable] is None]
+            heapq.heapify(self.order)
+
+    def decide(self):
+        """
+        Returns the literal of the most active unassigned variable, or
+        None if every variable is assigned.
+        """
+        while self.order:
+            _, variable = heapq.heappop(self.order)
+            if self.values[2 * variable] is None:
+                return 2 * variable + (not self.phases[variable])
+        return None
+
+    def solve(self, assumptions=()):
+        """
+        Returns True if the clauses can all be satisfied while the
+        `assumptions` literals are true, and False otherwise. After True,
+        `values` holds a satisfying assignment.
+        """
+        if not self.ok:
+            return False
+        self.backtrack(0)
+        if self.propagate() is not None:
+            self.ok = False
+            return False
+
+        conflicts = 0
+        restartLimit = RESTART_CONFLICTS
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                if not self.trailLimits:
+                    self.ok = False
+                    return False
+                conflicts += 1
+                learned, level = self.analyze(conflict)
+                self.backtrack(level)
+                if len(learned) == 1:
+                    self.assign(learned[0], None)
+                else:
+                    self.learned.append(learned)
+                    self.watch(learned)
+                    self.assign(learned[0], learned)
+                continue
+
+            if conflicts >= restartLimit:
+                conflicts = 0
+                restartLimit = int(restartLimit * RESTART_GROWTH)
+                self.backtrack(0)
+                continue
+
+            # Assume the assumptions first, one decision level each
+            literal = None
+            while len(self.trailLimits) < len(assumptions):
+                assumption = assumptions[len(self.trailLimits)]
+                if self.values[assumption] is False:
+                    self.backtrack(0)
+                    return False
+                self.trailLimits.append(len(self.trail))
+                if self.values[assumption] is None:
+                    literal = assumption
+                    break
+            else:
+                literal = self.decide()
+                if literal is None:
+                    return True
+                self.trailLimits.append(len(self.trail))
+            self.assign(literal, None)
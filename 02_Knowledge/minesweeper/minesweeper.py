@@ -1,5 +1,23 @@
 import itertools
+import math
 import random
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Components of the frontier are enumerated exactly unless that takes more
+# than this many search steps; then mine chances are estimated instead
+MAX_SEARCH_NODES = 200000
+
+# Frontiers with more cells than this are solved on several processes
+PARALLEL_CELLS = 60
+
+# Row and column steps to the eight cells around a cell
+NEIGHBOUR_OFFSETS = tuple((di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1)
+                          if di or dj)
 
 
 class Minesweeper():
@@ -14,25 +32,33 @@ class Minesweeper():
         self.width = width
         self.mines = set()
 
-        # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        # Initialize an empty field with no mines, one byte per cell
+        # at index i * width + j
+        self.cells = bytearray(height * width)
 
         # Add mines randomly
         while len(self.mines) != mines:
             i = random.randrange(height)
             j = random.randrange(width)
-            if not self.board[i][j]:
+            if not self.cells[i * width + j]:
                 self.mines.add((i, j))
-                self.board[i][j] = True
+                self.cells[i * width + j] = 1
+
+        # Number of mines next to every cell
+        self.counts = neighbour_counts(self.cells, height, width)
 
         # At first, player has found no mines
         self.mines_found = set()
 
+    @property
+    def board(self):
+        """
+        The field as rows of booleans, True where there is a mine.
+        """
+        return [[bool(self.cells[i * self.width + j])
+                 for j in range(self.width)]
+                for i in range(self.height)]
+
     def print(self):
         """
         Prints a text-based representation
@@ -41,7 +67,7 @@ class Minesweeper():
         for i in range(self.height):
             print("--" * self.width + "-")
             for j in range(self.width):
-                if self.board[i][j]:
+                if self.cells[i * self.width + j]:
                     print("|X", end="")
                 else:
                     print("| ", end="")
@@ -50,7 +76,7 @@ class Minesweeper():
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return self.cells[i * self.width + j] == 1
 
     def nearby_mines(self, cell):
         """
@@ -58,24 +84,8 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
-
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        i, j = cell
+        return self.counts[i * self.width + j]
 
     def won(self):
         """
@@ -84,6 +94,33 @@ class Minesweeper():
         return self.mines_found == self.mines
 
 
+def neighbour_counts(cells, height, width):
+    """
+    Returns a bytearray with the number of mines next to every cell of a
+    bytearray mine mask, as the sum of the mask shifted in all eight
+    directions.
+    """
+    if numpy is not None:
+        mask = numpy.frombuffer(bytes(cells), dtype=numpy.uint8)
+        padded = numpy.pad(mask.reshape(height, width), 1)
+        counts = sum(padded[1 + di:1 + di + height, 1 + dj:1 + dj + width]
+                     for di in (-1, 0, 1) for dj in (-1, 0, 1)
+                     if di or dj)
+        return bytearray(counts.astype(numpy.uint8).tobytes())
+
+    counts = bytearray(height * width)
+    index = cells.find(1)
+    while index != -1:
+        i, j = divmod(index, width)
+        for a in range(max(0, i - 1), min(height, i + 2)):
+            for b in range(max(0, j - 1), min(width, j + 2)):
+                counts[a * width + b] += 1
+        # The loop counted the mine itself too
+        counts[index] -= 1
+        index = cells.find(1, index + 1)
+    return counts
+
+
 class Sentence():
     """
     Logical statement about a Minesweeper game
@@ -140,12 +177,24 @@ class MinesweeperAI():
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, mines=None, parallel=False):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
+        # Total number of mines, if known, for weighing guesses
+        self.total_mines = mines
+
+        # Whether large frontiers may be solved on several processes. The
+        # pool is started on first use and stopped by close; on platforms
+        # that spawn processes the calling script needs a __main__ guard.
+        self.parallel = parallel
+        self.pool = None
+
+        # Solutions of frontier components, keyed by their constraints
+        self.component_cache = {}
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
@@ -153,29 +202,63 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Safe cells that have not been clicked on yet
+        self.safe_moves = set()
+
+        # Sentences about the game known to be true, keyed by the frozenset
+        # of their cells, and the keys of the sentences containing each cell
+        self.sentencesByCells = {}
+        self.sentences_with = {}
+
+        # Keys of sentences that changed and have to be looked at again
+        self.worklist = []
+        self.inferring = False
+
+    @property
+    def knowledge(self):
+        """
+        The list of sentences about the game known to be true.
+        """
+        return list(self.sentencesByCells.values())
+
+    def close(self):
+        """
+        Stops the worker processes of the AI, if it started any.
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
 
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
         """
+        if cell in self.mines:
+            return
         self.mines.add(cell)
-
-        for sentence in self.knowledge:
+        self.safe_moves.discard(cell)
+        for key in list(self.sentences_with.get(cell, ())):
+            sentence = self.sentencesByCells[key]
             sentence.mark_mine(cell)
-            self.check_sentence_terminalState(sentence)
+            self.rekey(key, sentence)
+        self.infer()
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
         """
+        if cell in self.safes:
+            return
         self.safes.add(cell)
-        for sentence in self.knowledge:
+        if cell not in self.moves_made:
+            self.safe_moves.add(cell)
+        for key in list(self.sentences_with.get(cell, ())):
+            sentence = self.sentencesByCells[key]
             sentence.mark_safe(cell)
-            self.check_sentence_terminalState(sentence)
+            self.rekey(key, sentence)
+        self.infer()
 
     def add_knowledge(self, cell, count):
         """
@@ -193,54 +276,83 @@ class MinesweeperAI():
                if they can be inferred from existing knowledge
         """
         self.moves_made.add(cell)
+        self.safe_moves.discard(cell)
         self.mark_safe(cell)
 
         all_neighbours, countMines = self.get_relevant_neighbours(cell)
+        self.add_sentence(Sentence(all_neighbours, count - countMines))
+        self.infer()
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge unless it has no cells or a
+        sentence about the same cells is known already.
+        """
+        key = frozenset(sentence.cells)
+        if not key or key in self.sentencesByCells:
+            return
+        self.sentencesByCells[key] = sentence
+        for cell in key:
+            self.sentences_with.setdefault(cell, set()).add(key)
+        self.worklist.append(key)
+
+    def remove_sentence(self, key):
+        del self.sentencesByCells[key]
+        for cell in key:
+            keys = self.sentences_with[cell]
+            keys.discard(key)
+            if not keys:
+                del self.sentences_with[cell]
+
+    def rekey(self, key, sentence):
+        """
+        Files a sentence whose cells changed under its new key, and
+        queues it to be looked at again.
+        """
+        self.remove_sentence(key)
+        self.add_sentence(sentence)
+
+    def infer(self):
+        """
+        Draws conclusions from the sentences in the worklist until there
+        are none left: all cells of a sentence are safe if its count is
+        zero, or mines if its count is its number of cells, and a sentence
+        whose cells are a subset of another's leaves a sentence about the
+        remaining cells.
+        """
+        if self.inferring:
+            return
+        self.inferring = True
+        try:
+            while self.worklist:
+                key = self.worklist.pop()
+                sentence = self.sentencesByCells.get(key)
+                if sentence is None:
+                    continue
+
+                if sentence.count == 0:
+                    for cell in key:
+                        self.mark_safe(cell)
+                    continue
+                if sentence.count == len(key):
+                    for cell in key:
+                        self.mark_mine(cell)
+                    continue
 
-        newSentence = Sentence(all_neighbours, count-countMines)
-        
-        self.checkIntersections(newSentence)
-        
-        newSentence = self.check_sentence_terminalState(newSentence)
-        self.knowledge.append(newSentence)
-
-        self.update_known_fields_clear_knowledge()     
-
-    def checkIntersections(self, newSentence):
-        for sentence in self.knowledge:
-            if newSentence.cells < sentence.cells and len(newSentence.cells)>0:
-                newIntersection = sentence.cells.difference(newSentence.cells)
-                minecount = self.subtract_numbers_positiv_result(sentence.count,newSentence.count)                
-                newDataSet = Sentence(newIntersection, minecount)
-
-                if not self.knowledge.__contains__(newDataSet):
-                    newDataSet = self.check_sentence_terminalState(newDataSet)
-                    self.knowledge.append(newDataSet)
-            elif newSentence.cells > sentence.cells and len(sentence.cells)>0:
-                newIntersection =newSentence.cells.difference(sentence.cells)
-                minecount = self.subtract_numbers_positiv_result(newSentence.count, sentence.count)               
-                newDataSet =  Sentence(newIntersection, minecount)
-
-                if not self.knowledge.__contains__(newDataSet):
-                    newDataSet = self.check_sentence_terminalState(newDataSet)
-                    self.knowledge.append(newDataSet)
-
-    
-    def update_known_fields_clear_knowledge(self):
-        useless_knowledge = []
-        for sentence in self.knowledge:
-            for safe in sentence.safe:
-                if not self.safes.__contains__(safe):
-                    self.mark_safe(safe)
-            for mine in sentence.mines:
-                if not self.mines.__contains__(mine):
-                    self.mark_mine(mine)
-
-        for sentence in self.knowledge:
-            if len(sentence.cells)==0:
-                useless_knowledge.append(sentence)       
-        for useless in useless_knowledge:
-            self.knowledge.remove(useless)
+                related = set()
+                for cell in key:
+                    related |= self.sentences_with[cell]
+                related.discard(key)
+                for other in related:
+                    otherSentence = self.sentencesByCells[other]
+                    if other < key:
+                        self.add_sentence(Sentence(
+                            key - other, sentence.count - otherSentence.count))
+                    elif key < other:
+                        self.add_sentence(Sentence(
+                            other - key, otherSentence.count - sentence.count))
+        finally:
+            self.inferring = False
 
     def get_relevant_neighbours(self, cell):
         all_neighbours =self.get_neighbours(cell)
@@ -256,39 +368,10 @@ class MinesweeperAI():
             all_neighbours.remove(not_relevant)
         return (all_neighbours,countMines)
 
-    def subtract_numbers_positiv_result(self, number1, number2):
-        minecount = number1-number2
-        if minecount < 0:
-            minecount = 0
-        return minecount
-
     def get_neighbours(self, cell):
-        neighbours = set()
-        for i in range(cell[0]-1,cell[0]+2):
-            if i < 0 or i>self.height-1 :
-                continue 
-            for a in range(cell[1]-1,cell[1]+2):
-                if a < 0 or a>self.width-1:
-                    continue
-                if (i,a) == cell:
-                    continue
-                neighbours.add((i,a))
-        return neighbours
-
-    def check_sentence_terminalState(self, sentence):
-        if len(sentence.cells) == sentence.count:
-            safeCells=set(sentence.cells)
-            for cell in safeCells:
-                self.mark_mine(cell)
-                sentence.mark_mine(cell)
-            return sentence
-        if sentence.count==0 and len(sentence.cells)>0:
-            safeCells=set(sentence.cells)
-            for cell in safeCells:
-                self.mark_safe(cell)
-                sentence.mark_safe(cell)
-            return sentence  
-        return sentence  
+        i, j = cell
+        return {(i + di, j + dj) for di, dj in NEIGHBOUR_OFFSETS
+                if 0 <= i + di < self.height and 0 <= j + dj < self.width}
 
     def make_safe_move(self):
         """
@@ -299,21 +382,257 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        for field in self.safes:
-            if not self.moves_made.__contains__(field):
-                return field
+        for field in self.safe_moves:
+            return field
         return None
 
     def make_random_move(self):
         """
         Returns a move to make on the Minesweeper board.
-        Should choose randomly among cells that:
+        Chooses among cells that:
             1) have not already been chosen, and
             2) are not known to be mines
+        the one least likely to be a mine; see mine_probabilities.
+        """
+        probabilities = self.mine_probabilities()
+        if not probabilities:
+            return None
+        return min(probabilities, key=lambda cell: (probabilities[cell], cell))
+
+    def mine_probabilities(self):
+        """
+        Returns the chance of being a mine of every cell that is neither
+        chosen nor known, given all sentences and the number of mines left.
+
+        The cells in sentences form components that share no sentence.
+        The mine layouts of every component that agree with its sentences
+        are enumerated, and layouts are weighed by the ways to place the
+        remaining mines on the cells no sentence is about.
         """
-        for i in range(self.height) :
-            for a in range(self.width):
-                currentfield = (i,a)
-                if not self.moves_made.__contains__(currentfield) and not self.mines.__contains__(currentfield):
-                    return currentfield
-        return None
\ No newline at end of file
+        unknown = [(i, j) for i in range(self.height)
+                   for j in range(self.width)
+                   if (i, j) not in self.moves_made
+                   and (i, j) not in self.mines
+                   and (i, j) not in self.safes]
+        if not unknown:
+            return {}
+
+        components = self.frontier_components()
+        solutions = self.solve_components(components)
+        frontierSize = sum(len(cells) for cells, _ in components)
+        free = len(unknown) - frontierSize
+        remaining = None
+        if self.total_mines is not None:
+            remaining = self.total_mines - len(self.mines)
+
+        def rest(mines):
+            # Ways to place the remaining mines off the frontier
+            if remaining is None:
+                return 1
+            return math.comb(free, remaining - mines) \
+                if 0 <= remaining - mines <= free else 0
+
+        # Mine count distributions of all components together except one
+        polynomials = [weights for weights, _ in solutions]
+        prefixes = [{0: 1}]
+        for polynomial in polynomials:
+            prefixes.append(multiply(prefixes[-1], polynomial))
+        suffixes = [{0: 1}]
+        for polynomial in reversed(polynomials):
+            suffixes.append(multiply(suffixes[-1], polynomial))
+        suffixes.reverse()
+
+        total = sum(ways * rest(mines)
+                    for mines, ways in prefixes[-1].items())
+        probabilities = {}
+        for index, ((cells, _), (weights, mineCounts)) in enumerate(
+                zip(components, solutions)):
+            others = multiply(prefixes[index], suffixes[index + 1])
+            factors = {mines: sum(ways * rest(mines + otherMines)
+                                  for otherMines, ways in others.items())
+                       for mines in weights}
+            for position, cell in enumerate(cells):
+                if total:
+                    probabilities[cell] = sum(
+                        counts[position] * factors[mines]
+                        for mines, counts in mineCounts.items()) / total
+                else:
+                    probabilities[cell] = sum(
+                        counts[position] for counts in mineCounts.values()
+                    ) / max(1, sum(weights.values()))
+
+        if free:
+            if remaining is not None and total:
+                expected = sum(ways * rest(mines) * (remaining - mines)
+                               for mines, ways in prefixes[-1].items())
+                freeProbability = expected / total / free
+            else:
+                # Without the mine count assume the density of the frontier
+                freeProbability = (sum(probabilities.values())
+                                   / max(1, len(probabilities)))
+                if not probabilities:
+                    freeProbability = 0.5
+            for cell in unknown:
+                if cell not in probabilities:
+                    probabilities[cell] = freeProbability
+        return probabilities
+
+    def frontier_components(self):
+        """
+        Splits the cells of all sentences into groups that share no
+        sentence. Returns a list of (cells, constraints) pairs, where each
+        constraint is a (cell positions, count) pair.
+        """
+        parents = {}
+
+        def find(cell):
+            while parents[cell] != cell:
+                parents[cell] = parents[parents[cell]]
+                cell = parents[cell]
+            return cell
+
+        for key in self.sentencesByCells:
+            first = None
+            for cell in key:
+                parents.setdefault(cell, cell)
+                if first is None:
+                    first = find(cell)
+                else:
+                    parents[find(cell)] = first
+
+        groups = {}
+        for cell in sorted(parents):
+            groups.setdefault(find(cell), []).append(cell)
+        constraintsOf = {}
+        for key, sentence in self.sentencesByCells.items():
+            root = find(next(iter(key)))
+            constraintsOf.setdefault(root, []).append((key, sentence.count))
+
+        components = []
+        for root, cells in groups.items():
+            positions = {cell: position for position, cell in enumerate(cells)}
+            constraints = sorted(
+                (tuple(sorted(positions[cell] for cell in key)), count)
+                for key, count in constraintsOf[root])
+            components.append((cells, constraints))
+        return components
+
+    def solve_components(self, components):
+        """
+        Returns (weights, mine counts) for every component as computed by
+        solve_component, reusing the results of components seen before.
+        """
+        keys = [(tuple(cells), tuple(constraints))
+                for cells, constraints in components]
+        missing = [key for key in set(keys) if key not in self.component_cache]
+        if len(self.component_cache) > 10000:
+            self.component_cache.clear()
+            missing = list(set(keys))
+
+        if (self.parallel and len(missing) > 1
+                and sum(len(cells) for cells, _ in missing) > PARALLEL_CELLS):
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor()
+            results = self.pool.map(
+                solve_component, [len(cells) for cells, _ in missing],
+                [constraints for _, constraints in missing])
+        else:
+            results = [solve_component(len(cells), constraints)
+                       for cells, constraints in missing]
+        for (cells, constraints), result in zip(missing, results):
+            if result is None:
+                result = estimate_component(len(cells), constraints)
+            self.component_cache[(cells, constraints)] = result
+        return [self.component_cache[key] for key in keys]
+
+
+def solve_component(size, constraints, max_nodes=MAX_SEARCH_NODES):
+    """
+    Enumerates the mine layouts of cells 0 .. size - 1 that satisfy every
+    (cell positions, count) constraint. Returns (weights, mine counts):
+    the number of layouts with each number of mines, and for each number
+    of mines how many of those layouts have a mine on every cell. Returns
+    None if that takes more than `max_nodes` steps.
+    """
+    constraintsOf = [[] for _ in range(size)]
+    for index, (cells, _) in enumerate(constraints):
+        for cell in cells:
+            constraintsOf[cell].append(index)
+    # Mines still needed and cells still open in every constraint
+    needed = [count for _, count in constraints]
+    open_ = [len(cells) for cells, _ in constraints]
+
+    # Visit cells constraint by constraint, so conflicts show up early
+    order = []
+    seen = set()
+    for cells, _ in constraints:
+        for cell in cells:
+            if cell not in seen:
+                seen.add(cell)
+                order.append(cell)
+
+    weights = {}
+    mineCounts = {}
+    layout = [False] * size
+    nodes = 0
+
+    def place(position, mines):
+        nonlocal nodes
+        nodes += 1
+        if nodes > max_nodes:
+            raise OverflowError()
+        if position == len(order):
+            weights[mines] = weights.get(mines, 0) + 1
+            counts = mineCounts.setdefault(mines, [0] * size)
+            for cell in range(size):
+                if layout[cell]:
+                    counts[cell] += 1
+            return
+        cell = order[position]
+        for isMine in (False, True):
+            possible = True
+            for index in constraintsOf[cell]:
+                open_[index] -= 1
+                needed[index] -= isMine
+                if needed[index] < 0 or needed[index] > open_[index]:
+                    possible = False
+            if possible:
+                layout[cell] = isMine
+                place(position + 1, mines + isMine)
+                layout[cell] = False
+            for index in constraintsOf[cell]:
+                open_[index] += 1
+                needed[index] += isMine
+
+    try:
+        place(0, 0)
+    except (OverflowError, RecursionError):
+        return None
+    return weights, mineCounts
+
+
+def estimate_component(size, constraints):
+    """
+    Approximates solve_component for components too large to enumerate:
+    every cell gets the highest mine density of the constraints on it,
+    and the component the rounded sum of those as its one mine count.
+    """
+    densities = [0.0] * size
+    for cells, count in constraints:
+        for cell in cells:
+            densities[cell] = max(densities[cell], count / len(cells))
+    mines = round(sum(densities))
+    # Scale to a weight of 1000 layouts so probabilities keep 3 digits
+    return ({mines: 1000},
+            {mines: [round(1000 * density) for density in densities]})
+
+
+def multiply(left, right):
+    """
+    Multiplies two polynomials given as {exponent: coefficient} dicts.
+    """
+    product = {}
+    for a, x in left.items():
+        for b, y in right.items():
+            product[a + b] = product.get(a + b, 0) + x * y
+    return product
@@ -0,0 +1,131 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from minesweeper import Minesweeper, MinesweeperAI
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play Minesweeper games with the AI, without a window."
+    )
+    parser.add_argument("configs", nargs="*", default=["8x8x8"],
+                        metavar="HxWxM",
+                        help="board height, width and number of mines "
+                             "(default: 8x8x8)")
+    parser.add_argument("--games", type=int, default=1000,
+                        help="games per configuration")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first game; game i uses seed + i")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--output", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "games": args.games,
+        "seed": args.seed,
+        "configs": {}
+    }
+    with multiprocessing.Pool(args.processes) as pool:
+        for config in args.configs:
+            try:
+                height, width, mines = (int(n) for n in config.split("x"))
+            except ValueError:
+                sys.exit(f"Invalid configuration: {config}")
+            if not 0 < mines < height * width:
+                sys.exit(f"Invalid number of mines: {config}")
+            print(f"Playing {config}...", file=sys.stderr)
+            games = [(height, width, mines, args.seed + i)
+                     for i in range(args.games)]
+            results["configs"][config] = summary(
+                pool.starmap(play, games, chunksize=16))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def play(height, width, mines, seed):
+    """
+    Plays one game with the AI, on the board that `seed` generates.
+    Returns whether the AI won, and the seconds every move took the AI
+    to choose and to learn from.
+    """
+    random.seed(seed)
+    game = Minesweeper(height=height, width=width, mines=mines)
+    ai = MinesweeperAI(height=height, width=width, mines=mines)
+
+    latencies = []
+    safeCells = height * width - mines
+    while True:
+        start = time.perf_counter()
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_random_move()
+        if move is None or game.is_mine(move):
+            latencies.append(time.perf_counter() - start)
+            break
+        ai.add_knowledge(move, game.nearby_mines(move))
+        latencies.append(time.perf_counter() - start)
+        if ai.mines == game.mines or len(ai.moves_made) == safeCells:
+            return True, latencies
+    return False, latencies
+
+
+def summary(games):
+    """
+    Returns win rate, speed and per-move latency of (won, latencies)
+    game results.
+    """
+    wins = sum(won for won, _ in games)
+    latencies = sorted(latency for _, gameLatencies in games
+                       for latency in gameLatencies)
+    seconds = sum(latencies)
+    return {
+        "games": len(games),
+        "wins": wins,
+        "win_rate": round(wins / len(games), 4),
+        "moves": len(latencies),
+        "moves_per_second": round(len(latencies) / seconds, 1)
+        if seconds else None,
+        "mean_ms": round(1000 * statistics.fmean(latencies), 3),
+        "p50_ms": round(1000 * percentile(latencies, 50), 3),
+        "p90_ms": round(1000 * percentile(latencies, 90), 3),
+        "p99_ms": round(1000 * percentile(latencies, 99), 3),
+        "max_ms": round(1000 * latencies[-1], 3)
+    }
+
+
+def percentile(values, percent):
+    """
+    Returns the nearest-rank percentile of sorted `values`.
+    """
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    main()